@@ -0,0 +1,168 @@
+"""
+Write-Behind Batch Writer
+
+Buffers documents in a bounded in-memory queue and writes them from a
+background thread with unordered insert_many calls, flushing whenever a batch
+fills up or the flush interval passes. Callers never wait on Mongo: when the
+queue is full they wait at most `block_timeout` seconds and then the event is
+dropped and counted.
+
+Writers are drained on close_all_writers() (called on app shutdown) and at
+interpreter exit. Events still queued when a process is killed are lost, so
+use this only for data that tolerates that, such as analytics.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+from database import create_documents
+
+logger = logging.getLogger(__name__)
+
+_writers: List["BatchWriter"] = []
+
+
+class BatchWriter:
+    """Background batching writer for one collection"""
+
+    def __init__(
+        self,
+        collection_name: str,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        block_timeout: float = 0.1,
+        insert: Optional[Callable[[str, List[dict]], list]] = None,
+    ):
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self._insert = insert or create_documents
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        _writers.append(self)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"batch-writer-{self.collection_name}", daemon=True
+                )
+                self._thread.start()
+
+    def enqueue(self, document: dict) -> bool:
+        """Queue a document for writing; False if it was dropped"""
+        if self._closed.is_set():
+            self.dropped += 1
+            return False
+        if self._thread is None:
+            self._start()
+        try:
+            if self.block_timeout > 0:
+                self._queue.put(document, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(document)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def _next_batch(self) -> List[dict]:
+        """Wait for the first document, then collect more until full or the interval ends"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if self._closed.is_set() or remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[dict]):
+        start = time.perf_counter()
+        try:
+            results = self._insert(self.collection_name, batch)
+            ok = sum(1 for r in results if r["ok"])
+            self.written += ok
+            self.failed += len(batch) - ok
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to write %d events to %s", len(batch), self.collection_name)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+
+    def _run(self):
+        while not (self._closed.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def close(self, timeout: float = 5.0):
+        """Stop accepting events and wait for the queue to drain"""
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "collection": self.collection_name,
+            "queue_depth": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+        }
+
+
+def writer_stats() -> List[dict]:
+    return [w.stats() for w in _writers]
+
+
+def close_all_writers(timeout: float = 5.0):
+    for writer in _writers:
+        writer.close(timeout)
+
+
+atexit.register(close_all_writers)
+
+
+def writer_from_env(collection_name: str) -> BatchWriter:
+    """BatchWriter configured from BATCH_WRITER_* environment variables"""
+    return BatchWriter(
+        collection_name,
+        max_queue=int(os.getenv("BATCH_WRITER_MAX_QUEUE", "10000")),
+        batch_size=int(os.getenv("BATCH_WRITER_BATCH_SIZE", "500")),
+        flush_interval=float(os.getenv("BATCH_WRITER_FLUSH_SECONDS", "1.0")),
+        block_timeout=float(os.getenv("BATCH_WRITER_BLOCK_SECONDS", "0.1")),
+    )
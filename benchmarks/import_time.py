@@ -0,0 +1,61 @@
+"""
+Import-Time Budget
+
+Measures how long a fresh interpreter takes to `import database` (the cost
+every worker, test run and CLI script pays) and fails when the median is
+over budget. Importing database.py must not connect, read .env or pull in
+pymongo; this also checks that.
+
+Run from anywhere: python benchmarks/import_time.py [--budget-ms 200] [--runs 7]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import database
+elapsed = (time.perf_counter() - start) * 1000
+print(elapsed, "pymongo" in sys.modules, database._client is not None)
+"""
+
+
+def measure_once() -> tuple:
+    env = dict(os.environ, DATABASE_URL="mongodb://127.0.0.1:1", DATABASE_NAME="import_time")
+    output = subprocess.check_output([sys.executable, "-c", PROBE.format(root=ROOT)], env=env, text=True)
+    elapsed, pymongo_loaded, connected = output.split()
+    return float(elapsed), pymongo_loaded == "True", connected == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import-time budget of database.py")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "200")))
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+
+    results = [measure_once() for _ in range(args.runs)]
+    timings = [r[0] for r in results]
+    median = statistics.median(timings)
+    print(f"import database: median {median:.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failures = []
+    if any(r[1] for r in results):
+        failures.append("pymongo was imported at import time")
+    if any(r[2] for r in results):
+        failures.append("a database client was created at import time")
+    if median > args.budget_ms:
+        failures.append(f"median import time {median:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Load Test
+
+Seeds the catalog through the API, then drives concurrent mixed read/write
+traffic and reports throughput and p50/p95/p99 latency per operation.
+
+By default the app is driven in-process against the mongomock stand-in, so
+nothing needs to be running:
+
+    python benchmarks/load.py --batmobiles 5000 --gadgets 2000 --duration 15
+
+Point it at a running server (e.g. one backed by a local mongod) instead with
+--url http://localhost:8000 (raise its RATE_LIMIT_* limits first, as all the
+traffic comes from one client). Use --report out.json to write the machine-readable
+report, which can be diffed across changes.
+
+Requires httpx, plus mongomock and mongomock-motor for the in-process mode
+(pip install -r requirements-dev.txt).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ERAS = ["Golden Age", "Silver Age", "Burtonverse", "Schumacher", "Nolan", "DCEU", "Reeves", "DCAU", "Arkham"]
+MEDIA = ["Film", "TV", "Animation", "Game", "Comic"]
+CATEGORIES = ["Offensive", "Mobility", "Stealth", "Utility", "Forensics", "Survival", "Surveillance"]
+
+
+def batmobile(i: int, run_id: str) -> dict:
+    return {
+        "name": f"Load Batmobile {run_id}-{i}",
+        "year": 1940 + i % 85,
+        "media": MEDIA[i % len(MEDIA)],
+        "title": f"Load Title {i}",
+        "era": ERAS[i % len(ERAS)],
+        "universe": MEDIA[(i // 3) % len(MEDIA)],
+        "description": "Armored pursuit vehicle with jet turbine, grapple and stealth mode. " * 2,
+        "image_url": f"https://images.unsplash.com/photo-{i}?q=80&w=1600&auto=format&fit=crop",
+        "specs": ["Jet turbine", "Grapple", "Stealth mode"],
+    }
+
+
+def gadget(i: int, run_id: str) -> dict:
+    return {
+        "name": f"Load Gadget {run_id}-{i}",
+        "category": CATEGORIES[i % len(CATEGORIES)],
+        "description": "Compact utility-belt device for field operations.",
+    }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, op: str, client: httpx.AsyncClient, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        self.latencies[op].append(time.perf_counter() - start)
+        if not ok:
+            self.errors[op] += 1
+
+
+async def seed(client: httpx.AsyncClient, recorder: Recorder, args, run_id: str) -> dict:
+    """Bulk-load the catalog through the batch POST endpoints and the seed routes"""
+    start = time.perf_counter()
+    for path, make, total in [("/api/batmobiles/bulk", batmobile, args.batmobiles), ("/api/gadgets/bulk", gadget, args.gadgets)]:
+        for offset in range(0, total, args.batch):
+            items = [make(i, run_id) for i in range(offset, min(offset + args.batch, total))]
+            await recorder.call("seed_bulk", client, "POST", path, json=items)
+    await recorder.call("seed_routes", client, "POST", "/api/seed/batmobiles")
+    await recorder.call("seed_routes", client, "POST", "/api/seed/gadgets")
+    elapsed = time.perf_counter() - start
+    return {"elapsed_s": round(elapsed, 3), "documents": args.batmobiles + args.gadgets}
+
+
+def operations(run_id: str):
+    """Weighted mix of (name, weight, request factory)"""
+    counter = iter(range(10**9))
+    return [
+        ("list_batmobiles", 30, lambda: ("GET", "/api/batmobiles", {"params": {"limit": 50}})),
+        ("list_gadgets", 15, lambda: ("GET", "/api/gadgets", {"params": {"limit": 50}})),
+        ("filter_batmobiles", 20, lambda: ("GET", "/api/batmobiles", {"params": {"era": random.choice(ERAS), "sort": "-year", "limit": 20}})),
+        ("facets", 5, lambda: ("GET", "/api/batmobiles/facets", {})),
+        ("search", 5, lambda: ("GET", "/api/search", {"params": {"q": random.choice(["stealth", "grapple", "turbine", "tumbler"])}})),
+        ("create_batmobile", 15, lambda: ("POST", "/api/batmobiles", {"json": batmobile(10**6 + next(counter), run_id)})),
+        ("create_gadget", 7, lambda: ("POST", "/api/gadgets", {"json": gadget(10**6 + next(counter), run_id)})),
+        ("seed", 3, lambda: ("POST", random.choice(["/api/seed/batmobiles", "/api/seed/gadgets"]), {})),
+    ]
+
+
+async def drive(client: httpx.AsyncClient, recorder: Recorder, args, run_id: str) -> float:
+    ops = operations(run_id)
+    names = [op[0] for op in ops]
+    weights = [op[1] for op in ops]
+    factories = {op[0]: op[2] for op in ops}
+    deadline = time.perf_counter() + args.duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            name = random.choices(names, weights)[0]
+            method, url, kwargs = factories[name]()
+            await recorder.call(name, client, method, url, **kwargs)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return time.perf_counter() - start
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    random.seed(args.seed)
+    run_id = f"{int(time.time())}"
+    app = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30)
+    else:
+        os.environ.setdefault("DATABASE_URL", "mongomock://")
+        os.environ.setdefault("DATABASE_NAME", "load_test")
+        # All traffic comes from one client; measure the app, not the limiter
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+        sys.path.insert(0, ROOT)
+        import main
+
+        app = main
+        await main.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://load-test", timeout=30)
+
+    try:
+        seed_recorder = Recorder()
+        seed_info = await seed(client, seed_recorder, args, run_id)
+        recorder = Recorder()
+        elapsed = await drive(client, recorder, args, run_id)
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.shutdown()
+
+    all_latencies = [v for values in recorder.latencies.values() for v in values]
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "target": args.url or "in-process (mongomock)",
+        "config": {
+            "batmobiles": args.batmobiles,
+            "gadgets": args.gadgets,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "seed": args.seed,
+        },
+        "seed": dict(seed_info, **{op: summarize(seed_recorder.latencies[op], seed_recorder.errors[op], seed_info["elapsed_s"]) for op in seed_recorder.latencies}),
+        "overall": summarize(all_latencies, sum(recorder.errors.values()), elapsed),
+        "operations": {op: summarize(recorder.latencies[op], recorder.errors[op], elapsed) for op in sorted(recorder.latencies)},
+    }
+
+
+def print_table(report: dict):
+    print(f"target: {report['target']}  revision: {report['git_revision']}")
+    print(f"seeded {report['seed']['documents']} documents in {report['seed']['elapsed_s']}s")
+    print(f"{'operation':<20}{'reqs':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in list(report["operations"].items()) + [("overall", report["overall"])]:
+        print(f"{name:<20}{s['requests']:>8}{s['errors']:>6}{s['throughput_rps']:>10}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server; omit to drive the app in-process")
+    parser.add_argument("--batmobiles", type=int, default=2000, help="Batmobiles to seed")
+    parser.add_argument("--gadgets", type=int, default=1000, help="Gadgets to seed")
+    parser.add_argument("--batch", type=int, default=500, help="Items per bulk POST while seeding")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of mixed traffic")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the traffic mix")
+    parser.add_argument("--report", help="Write the JSON report to this path")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(run(args))
+    print_table(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.report}")
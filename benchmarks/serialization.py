@@ -0,0 +1,84 @@
+"""
+Serialization Benchmark
+
+Per-row cost of rendering a 10k-document Batmobile list response:
+- response_model: what FastAPI does for `response_model=List[Batmobile]`
+  (validate every row, jsonable_encoder, json.dumps)
+- validated: TypeAdapter validate + dump_json (TRUSTED_READS=0)
+- trusted: serialize_page with TRUSTED_READS (projection-shaped rows to orjson)
+
+Run from the repository root: python benchmarks/serialization.py [rows]
+No database is needed.
+"""
+
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import main
+from schemas import Batmobile
+
+
+def make_rows(count: int) -> List[dict]:
+    """Rows shaped like get_page_async output: the stored catalog document plus its `id`"""
+    return [
+        dict(id=f"{i:024x}", **Batmobile(
+            name=f"Batmobile {i}",
+            year=1940 + i % 85,
+            media="Film",
+            title=f"Batman #{i}",
+            universe="Film",
+            era="Nolan",
+            description="Military prototype bridging tank and supercar; jump capability. " * 2,
+            image_url=f"https://images.unsplash.com/photo-{i}?q=80&w=1600&auto=format&fit=crop",
+            specs=["Stealth mode", "Jump pack", "Afterburner"],
+        ).model_dump(mode="json"))
+        for i in range(count)
+    ]
+
+
+def timed(fn, rows: List[dict], repeat: int = 5) -> float:
+    """Best wall time over `repeat` runs, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def response_model_path(rows: List[dict]) -> bytes:
+    adapter = TypeAdapter(List[Batmobile])
+    return json.dumps(jsonable_encoder(adapter.validate_python(rows))).encode()
+
+
+def validated_path(rows: List[dict]) -> bytes:
+    adapter = TypeAdapter(List[Batmobile])
+    return adapter.dump_json(adapter.validate_python(rows))
+
+
+def trusted_path(rows: List[dict]) -> bytes:
+    return main.serialize_page(Batmobile, rows, None)
+
+
+def run(count: int):
+    rows = make_rows(count)
+    trusted = [{k: v for k, v in row.items() if k != "id"} for row in orjson.loads(trusted_path(rows))]
+    assert trusted == orjson.loads(validated_path(rows))
+    print(f"{count} rows")
+    for name, fn in [("response_model", response_model_path), ("validated", validated_path), ("trusted", trusted_path)]:
+        seconds = timed(fn, rows)
+        print(f"  {name:<15} {seconds * 1000:8.1f} ms total  {seconds / count * 1e6:6.2f} us/row")
+
+
+if __name__ == "__main__":
+    main.TRUSTED_READS = True
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,132 @@
+"""
+Response Cache
+
+Bounded in-process LRU cache with a TTL for serialized list responses.
+Entries are grouped by collection and dropped whenever that collection is
+written to (see database.add_write_listener). Each worker process has its
+own cache, so the TTL bounds how stale another worker's writes can look.
+
+The cache is bounded by entry count (CACHE_MAX_ENTRIES) and by the bytes its
+bodies hold (CACHE_MAX_BYTES), counting the compressed variants of an
+EncodedBody too. Variants are compressed while serving, so an entry is
+re-measured each time it is hit.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+def entry_size(value) -> int:
+    """Bytes held by a cached value: bodies (EncodedBody or bytes) and strings in it"""
+    size = 0
+    for item in value if isinstance(value, tuple) else (value,):
+        if hasattr(item, "nbytes"):
+            size += item.nbytes
+        elif isinstance(item, (bytes, str)):
+            size += len(item)
+    return size
+
+
+class ResponseCache:
+    """LRU + TTL cache of already-serialized response bodies, bounded by count and bytes"""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 30.0, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # (collection, key) -> (expires_at, value, size)
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, collection_name: str) -> int:
+        """Write generation of a collection; pass it back to put() to avoid caching stale reads"""
+        return self._generations.get(collection_name, 0)
+
+    def get(self, collection_name: str, key: Hashable) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get((collection_name, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, size = entry
+            if expires_at < time.monotonic():
+                del self._entries[(collection_name, key)]
+                self.bytes -= size
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end((collection_name, key))
+            current = entry_size(value)
+            if current != size:
+                # Grown by the variants compressed since it was last measured
+                self._entries[(collection_name, key)] = (expires_at, value, current)
+                self.bytes += current - size
+                self._evict()
+            self.hits += 1
+            return value
+
+    def put(self, collection_name: str, key: Hashable, value: tuple, generation: int):
+        with self._lock:
+            if generation != self.generation(collection_name):
+                # The collection changed while this value was being computed
+                return
+            size = entry_size(value)
+            previous = self._entries.pop((collection_name, key), None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            if size > self.max_bytes:
+                # Would push everything else out
+                return
+            self._entries[(collection_name, key)] = (time.monotonic() + self.ttl_seconds, value, size)
+            self.bytes += size
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until both bounds hold (lock held)"""
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def invalidate(self, collection_name: str, *args):
+        """Drop every entry for a collection (usable directly as a write listener)"""
+        with self._lock:
+            self._generations[collection_name] = self.generation(collection_name) + 1
+            stale = [k for k in self._entries if k[0] == collection_name]
+            for k in stale:
+                self.bytes -= self._entries.pop(k)[2]
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "256")),
+    ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "30")),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+)
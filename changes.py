@@ -0,0 +1,283 @@
+"""
+Change Feed
+
+Live catalog changes for GET /api/stream/changes (Server-Sent Events).
+
+Each worker keeps one upstream source and fans every change out to its
+connected clients:
+- a MongoDB change stream on the catalog collections when the server
+  supports it (replica sets), which also sees writes made by other workers
+  and processes
+- otherwise the in-process write listener bus (database.add_write_listener),
+  which only sees writes made by this worker. Writes by other workers are
+  noticed by polling the collection revisions every
+  SSE_REVISION_POLL_SECONDS and announced as a "refresh" event (reload the
+  lists) since their contents are unknown.
+
+Every stream starts with a "feed" event naming the source and whether its
+change events cover all workers.
+
+Every client has a bounded queue. A client that falls SSE_QUEUE_SIZE events
+behind is sent a "reset" event and disconnected rather than slowing everyone
+else down; it should reload the lists and reconnect. Writes touching more
+than SSE_MAX_DOCUMENTS_PER_EVENT documents (bulk loads, seeding) are sent as
+one "bulk" event without the documents.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Set
+
+import orjson
+
+from database import add_write_listener, get_revision_async, peek_revision, watch_async
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "1000"))
+MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", "1000"))
+HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+MAX_DOCUMENTS_PER_EVENT = int(os.getenv("SSE_MAX_DOCUMENTS_PER_EVENT", "100"))
+REVISION_POLL_SECONDS = float(os.getenv("SSE_REVISION_POLL_SECONDS", "2"))
+SOURCE_WAIT_SECONDS = 5.0
+
+sse_clients = Gauge("sse_clients", "Clients connected to the change feed")
+sse_slow_consumers = Counter("sse_slow_consumers_total", "Change feed clients disconnected for falling behind")
+
+_RESET = object()
+_CLOSED = object()
+
+
+def _json_default(value):
+    # ObjectId, datetime and anything else BSON hands back
+    if isinstance(value, datetime):
+        # Datetimes read back from Mongo are naive UTC
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+    return str(value)
+
+
+def format_event(event: str, data: dict, event_id: Optional[int] = None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + orjson.dumps(data, default=_json_default).decode())
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class _Subscriber:
+    def __init__(self, collections: Optional[Set[str]]):
+        self.collections = collections
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+
+class ChangeFeed:
+    """One upstream change source per worker, fanned out to per-client queues"""
+
+    def __init__(self, collections: List[str]):
+        self.collections = list(collections)
+        self.source = None
+        self.published = 0
+        self.refreshes = 0
+        # collection -> latest revision accounted for by events (bus only)
+        self._revisions = {}
+        self._source_known: Optional[asyncio.Event] = None
+        self._subscribers: Set[_Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        add_write_listener(self._on_write)
+
+    # ---- upstream ----
+    def _start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._source_known = asyncio.Event()
+            self._task = self._loop.create_task(self._watch())
+
+    async def _watch(self):
+        """Follow the change stream; fall back to the write listener bus if there is none"""
+        while True:
+            try:
+                async with watch_async(self.collections, ["insert", "update", "replace", "delete"]) as stream:
+                    self.source = "change_stream"
+                    self._source_known.set()
+                    async for change in stream:
+                        self._publish_change(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.source != "change_stream":
+                    # Standalone servers and mongomock have no change streams
+                    logger.info("Change streams unavailable, using the in-process bus: %s", e)
+                    self.source = "bus"
+                    self._source_known.set()
+                    await self._poll_revisions()
+                    return
+                # The driver already retried once; back off and reopen
+                logger.warning("Change stream interrupted, reopening: %s", e)
+                await asyncio.sleep(1.0)
+
+    async def _poll_revisions(self):
+        """Announce writes made by other workers, which the bus cannot see"""
+        while True:
+            for collection_name in self.collections:
+                try:
+                    revision, _ = await get_revision_async(collection_name)
+                except Exception as e:
+                    logger.warning("Could not read the %s revision: %s", collection_name, e)
+                    continue
+                self._advance(collection_name, revision, local=False)
+            await asyncio.sleep(REVISION_POLL_SECONDS)
+
+    def _advance(self, collection_name: str, revision: Optional[int], local: bool):
+        """Record a revision; publish a refresh if writes we have no events for happened before it"""
+        if revision is None:
+            return
+        known = self._revisions.get(collection_name)
+        self._revisions[collection_name] = max(revision, known or 0)
+        # A local write accounts for exactly one revision
+        if known is not None and revision > known + (1 if local else 0):
+            self.refreshes += 1
+            self.publish(collection_name, {"collection": collection_name, "revision": revision}, "refresh")
+
+    def _publish_change(self, change: dict):
+        operation = change["operationType"]
+        document = change.get("fullDocument")
+        if document is None and operation == "update":
+            document = change.get("updateDescription", {}).get("updatedFields")
+        self.publish(change["ns"]["coll"], {
+            "collection": change["ns"]["coll"],
+            "operation": "update" if operation == "replace" else operation,
+            "id": str(change["documentKey"]["_id"]),
+            "document": document,
+        })
+
+    def _on_write(self, collection_name: str, operation: str, documents: List[dict]):
+        """Write listener feeding the bus; may be called from any thread"""
+        if self.source != "bus" or collection_name not in self.collections:
+            return
+        # Read now: by the time the loop runs the callback other writes may have bumped it
+        revision = peek_revision(collection_name)
+        if not self._subscribers:
+            events = []
+        elif len(documents) > MAX_DOCUMENTS_PER_EVENT:
+            events = [("bulk", {"collection": collection_name, "operation": operation, "count": len(documents)})]
+        else:
+            events = [
+                ("change", {
+                    "collection": collection_name,
+                    "operation": operation,
+                    "id": str(doc["_id"]) if "_id" in doc else None,
+                    "document": None if operation == "delete" else {k: v for k, v in doc.items() if k != "_id"},
+                })
+                for doc in documents
+            ]
+        if threading.get_ident() == self._loop_thread:
+            self._publish_local(collection_name, revision, events)
+        else:
+            self._loop.call_soon_threadsafe(self._publish_local, collection_name, revision, events)
+
+    def _publish_local(self, collection_name: str, revision: Optional[int], events: list):
+        self._advance(collection_name, revision, local=True)
+        for event, data in events:
+            self.publish(collection_name, data, event)
+
+    # ---- fan-out ----
+    def publish(self, collection_name: str, data: dict, event: str = "change"):
+        """Queue one event for every interested client (on the event loop)"""
+        self.published += 1
+        message = format_event(event, data, self.published)
+        for subscriber in list(self._subscribers):
+            if subscriber.collections is not None and collection_name not in subscriber.collections:
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow consumer: replace its backlog with a reset and drop it
+                sse_slow_consumers.inc()
+                self._subscribers.discard(subscriber)
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(_RESET)
+
+    def is_full(self) -> bool:
+        return len(self._subscribers) >= MAX_CLIENTS
+
+    async def subscribe(self, collections: Optional[Set[str]] = None) -> AsyncIterator[bytes]:
+        """SSE byte stream for one client, ending when it is dropped or the feed closes"""
+        self._start()
+        subscriber = _Subscriber(collections)
+        self._subscribers.add(subscriber)
+        sse_clients.inc()
+        try:
+            yield b"retry: 3000\n\n"
+            if not self._source_known.is_set():
+                try:
+                    await asyncio.wait_for(self._source_known.wait(), SOURCE_WAIT_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            yield format_event("feed", self.scope())
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield b": keepalive\n\n"
+                    continue
+                if message is _CLOSED:
+                    return
+                if message is _RESET:
+                    yield format_event("reset", {"reason": "client fell behind; reload and reconnect"})
+                    return
+                yield message
+        finally:
+            self._subscribers.discard(subscriber)
+            sse_clients.dec()
+
+    async def close(self):
+        """Stop the upstream source and end every client stream (call on shutdown)"""
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(_CLOSED)
+            except asyncio.QueueFull:
+                subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(_CLOSED)
+        self._subscribers.clear()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.wait({self._task}, timeout=1.0)
+            self._task = None
+        self.source = None
+        self._revisions.clear()
+
+    def scope(self) -> dict:
+        """What the change events of this worker's feed cover"""
+        if self.source == "bus":
+            detail = (
+                "change events cover writes made by this worker only; writes by other workers "
+                f"are announced as refresh events within {REVISION_POLL_SECONDS:g}s"
+            )
+        elif self.source == "change_stream":
+            detail = "change events cover writes made by every worker and process"
+        else:
+            detail = "source not determined yet"
+        return {"source": self.source, "all_workers": self.source == "change_stream", "detail": detail}
+
+    def stats(self) -> dict:
+        return {
+            **self.scope(),
+            "refreshes": self.refreshes,
+            "clients": len(self._subscribers),
+            "max_clients": MAX_CLIENTS,
+            "queue_size": QUEUE_SIZE,
+            "published": self.published,
+        }
+
+
+catalog_changes = ChangeFeed(["batmobile", "gadget"])
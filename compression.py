@@ -0,0 +1,206 @@
+"""
+Response Compression
+
+Compresses response bodies for clients that send Accept-Encoding:
+- gzip always; Brotli ("br") and zstd when the `brotli` / `zstandard`
+  packages are installed, preferred in that order
+- only bodies of at least COMPRESSION_MIN_BYTES with an allowlisted
+  content type (JSON, NDJSON, text)
+- streamed bodies (NDJSON exports) are gzip-compressed chunk by chunk and
+  flushed after every chunk, so rows still reach the client as they are read
+
+Cached responses wrap their body in an EncodedBody, which keeps every
+compressed variant it has produced; encoded_response() serves those and the
+middleware leaves responses that already carry a Content-Encoding alone.
+"""
+
+import gzip
+import os
+import zlib
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Server preference, best first
+ENCODINGS: Tuple[str, ...] = tuple(
+    name for name, available in (("br", brotli), ("zstd", zstandard), ("gzip", gzip)) if available is not None
+)
+STREAM_ENCODINGS = ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str], supported=ENCODINGS) -> Optional[str]:
+    """The supported encoding with the highest q-value in Accept-Encoding, or None"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    # Server-sent events are tiny, latency-sensitive messages
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class EncodedBody:
+    """A serialized response body and its compressed variants, each computed once"""
+
+    __slots__ = ("raw", "_variants")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._variants: Dict[str, bytes] = {}
+
+    def __len__(self):
+        return len(self.raw)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the body and every variant produced so far"""
+        return len(self.raw) + sum(len(variant) for variant in self._variants.values())
+
+    def encode(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.raw
+        variant = self._variants.get(encoding)
+        if variant is None:
+            # Two requests racing here both compress; either result is fine
+            variant = self._variants[encoding] = compress(self.raw, encoding)
+        return variant
+
+
+def encoded_response(request: Request, body: EncodedBody, headers: dict, media_type: str = "application/json") -> Response:
+    """Response for a cached body, compressed when the client accepts it"""
+    encoding = negotiate(request.headers.get("accept-encoding")) if len(body) >= MIN_SIZE else None
+    response = Response(content=body.encode(encoding), media_type=media_type, headers=headers)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+        response.headers.add_vary_header("Accept-Encoding")
+    return response
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing eligible responses that are not compressed yet"""
+
+    def __init__(self, app, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding")
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingSender(send, encoding, negotiate(accept_encoding, STREAM_ENCODINGS), self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingSender:
+    """Holds back http.response.start until the first body chunk shows what to do"""
+
+    def __init__(self, send, encoding: str, stream_encoding: Optional[str], minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.stream_encoding = stream_encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def send(self, message):
+        if self.passthrough:
+            await self._send(message)
+            return
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        if self.compressor is not None:
+            await self._send_stream_chunk(message)
+            return
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if (
+            "content-encoding" in headers
+            or not is_compressible(headers.get("content-type"))
+            or (not more_body and len(body) < self.minimum_size)
+            or (more_body and self.stream_encoding is None)
+        ):
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        headers.add_vary_header("Accept-Encoding")
+        if not more_body:
+            compressed = compress(body, self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(compressed))
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+
+        headers["Content-Encoding"] = self.stream_encoding
+        if "content-length" in headers:
+            del headers["content-length"]
+        self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        await self._send(self.start_message)
+        await self._send_stream_chunk(message)
+
+    async def _send_stream_chunk(self, message):
+        chunk = self.compressor.compress(message.get("body", b""))
+        more_body = message.get("more_body", False)
+        # Sync-flush each chunk so streamed rows are not held in the compressor
+        chunk += self.compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -3,53 +3,1013 @@ Database Helper Functions
 
 MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
+
+Two flavours of every helper are available:
+- Blocking helpers (create_document, get_documents) backed by pymongo
+- Async helpers (create_document_async, get_documents_async) backed by Motor,
+  for use from `async def` routes once connect_async_db() has run on startup
+
+Set DATABASE_URL to "mongomock://" to run against an in-process stand-in
+(requires the mongomock and mongomock-motor packages).
 """
 
-from pymongo import MongoClient
+from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime, timezone
+import asyncio
+import base64
+import functools
+import inspect
+import json
+import logging
 import os
-from dotenv import load_dotenv
-from typing import Union
+import threading
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterable, List, Optional, Tuple, Union
 from pydantic import BaseModel
 
-# Load environment variables from .env file
-load_dotenv()
+from metrics import get_command_listener
+from slowlog import document_count, slow_queries, summarize_explain
+
+if TYPE_CHECKING:
+    from pymongo import UpdateOne
+    from pymongo.errors import BulkWriteError
+
+# Importing this module has no side effects: the .env file is read and the
+# clients are created on first use (pymongo itself is only imported then),
+# so tests, scripts and worker startup don't pay for a connection. The
+# blocking client is also recreated in a forked child rather than reused.
+
+logger = logging.getLogger(__name__)
 
 _client = None
-db = None
+_client_pid = None
+_db = None
+_client_lock = threading.Lock()
 
-database_url = os.getenv("DATABASE_URL")
-database_name = os.getenv("DATABASE_NAME")
+_async_client = None
+async_db = None
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+_env_loaded = False
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+MOCK_URL_PREFIX = "mongomock://"
 
+def _database_settings() -> Tuple[Optional[str], Optional[str]]:
+    """(DATABASE_URL, DATABASE_NAME), loading the .env file on first call"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        # Load environment variables from .env file
+        load_dotenv()
+        _env_loaded = True
+    return os.getenv("DATABASE_URL"), os.getenv("DATABASE_NAME")
+
+def _client_options() -> dict:
+    """Connection pool and timeout settings, tunable through environment variables"""
+    return {
+        "maxPoolSize": int(os.getenv("DATABASE_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("DATABASE_MIN_POOL_SIZE", "0")),
+        "serverSelectionTimeoutMS": int(os.getenv("DATABASE_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.getenv("DATABASE_CONNECT_TIMEOUT_MS", "5000")),
+        "socketTimeoutMS": int(os.getenv("DATABASE_SOCKET_TIMEOUT_MS", "30000")),
+        # Per-command latency and result sizes for GET /metrics
+        "event_listeners": [get_command_listener()],
+    }
+
+def _is_mock_url(url: str) -> bool:
+    return url.startswith(MOCK_URL_PREFIX)
+
+def is_mock_database() -> bool:
+    """True when running against the in-process stand-in instead of a real server"""
+    database_url, _ = _database_settings()
+    return bool(database_url) and _is_mock_url(database_url)
+
+def connect_db():
+    """Create the blocking client and return the database (None if not configured).
+
+    Called lazily by get_db(); call it explicitly to connect eagerly.
+    """
+    global _client, _client_pid, _db
+    with _client_lock:
+        if _db is not None and _client_pid == os.getpid():
+            return _db
+        database_url, database_name = _database_settings()
+        if not (database_url and database_name):
+            return None
+        if _is_mock_url(database_url):
+            import mongomock
+            _client = mongomock.MongoClient()
+        else:
+            from pymongo import MongoClient
+            _client = MongoClient(database_url, **_client_options())
+        _client_pid = os.getpid()
+        _db = _client[database_name]
+        return _db
+
+def get_db():
+    """The blocking database handle, connecting on first use in this process"""
+    if _db is not None and _client_pid == os.getpid():
+        return _db
+    return connect_db()
+
+def close_db():
+    """Close the blocking client; the next get_db() reconnects"""
+    global _client, _client_pid, _db
+    with _client_lock:
+        database_url, _ = _database_settings()
+        if _client is not None and _client_pid == os.getpid() and not _is_mock_url(database_url or ""):
+            _client.close()
+        _client, _client_pid, _db = None, None, None
+
+def __getattr__(name):
+    # Keeps `from database import db` working without connecting at import time
+    if name == "db":
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _prepare_document(data: Union[BaseModel, dict]) -> dict:
+    """Convert a model or dict into an insertable document with timestamps"""
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
-        data_dict = data.model_dump()
+        data_dict = data.model_dump(mode="json")
     else:
         data_dict = data.copy()
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    now = datetime.now(timezone.utc)
+    data_dict['created_at'] = now
+    data_dict['updated_at'] = now
+    return data_dict
+
+# Write listeners are called after every successful write made through these
+# helpers as listener(collection_name, operation, documents), e.g. to
+# invalidate caches. `documents` are the written documents (including _id,
+# except for filter-based updates); operation is "insert", "update" or
+# "delete" (deletes only carry the _id, updates may only carry the fields
+# they set).
+_write_listeners: List[Callable[[str, str, List[dict]], None]] = []
+
+def add_write_listener(listener: Callable[[str, str, List[dict]], None]):
+    """Register a callback to run after writes"""
+    _write_listeners.append(listener)
+
+def _notify_write(collection_name: str, operation: str, documents: List[dict]):
+    for listener in _write_listeners:
+        try:
+            listener(collection_name, operation, documents)
+        except Exception:
+            logger.exception("Write listener failed for %s", collection_name)
+
+# Collections registered with track_revisions() have a revision document in
+# REVISIONS_COLLECTION, bumped after each write made through these helpers.
+# It is a version stamp shared by all worker processes (used for ETags and
+# cache keys). Each worker keeps the last value it saw for up to
+# REVISION_TTL_SECONDS, refreshed by its own writes, so a read only goes to
+# Mongo once per interval and other workers' writes show up within it.
+# Writes that bypass the helpers do not bump it.
+REVISIONS_COLLECTION = "_revisions"
+REVISION_TTL_SECONDS = float(os.getenv("REVISION_TTL_SECONDS", "1"))
+
+_tracked_revisions = set()
+# collection name -> (expiry on the monotonic clock, revision, last write time)
+_revision_cache = {}
+
+def track_revisions(collection_names: Iterable[str]):
+    """Keep a revision for these collections (only cached/ETagged ones need it)"""
+    _tracked_revisions.update(collection_names)
+
+def _revision_update() -> dict:
+    return {"$inc": {"revision": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+
+def _remember_revision(collection_name: str, doc: Optional[dict]) -> Tuple[int, Optional[datetime]]:
+    revision, updated_at = (doc.get("revision", 0), doc.get("updated_at")) if doc else (0, None)
+    if updated_at is not None and updated_at.tzinfo is None:
+        # Stored datetimes come back naive (UTC)
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    cached = _revision_cache.get(collection_name)
+    if cached is not None and cached[1] > revision:
+        # A read that started before one of our writes finished late
+        return cached[1], cached[2]
+    _revision_cache[collection_name] = (time.monotonic() + REVISION_TTL_SECONDS, revision, updated_at)
+    return revision, updated_at
+
+def peek_revision(collection_name: str) -> Optional[int]:
+    """Last revision this worker saw for a collection, however old, without a query"""
+    cached = _revision_cache.get(collection_name)
+    return cached[1] if cached is not None else None
+
+def _written(collection_name: str, operation: str, documents: List[dict], *more: Tuple[str, List[dict]]):
+    """Bookkeeping after a successful blocking write; `more` adds (operation, documents) pairs"""
+    changes = [(op, docs) for op, docs in ((operation, documents),) + more if docs]
+    if not changes:
+        return
+    if collection_name in _tracked_revisions:
+        from pymongo import ReturnDocument
+        doc = get_db()[REVISIONS_COLLECTION].find_one_and_update(
+            {"_id": collection_name}, _revision_update(), upsert=True, return_document=ReturnDocument.AFTER
+        )
+        _remember_revision(collection_name, doc)
+    for op, docs in changes:
+        _notify_write(collection_name, op, docs)
+
+async def _written_async(collection_name: str, operation: str, documents: List[dict], *more: Tuple[str, List[dict]]):
+    """Bookkeeping after a successful async write"""
+    changes = [(op, docs) for op, docs in ((operation, documents),) + more if docs]
+    if not changes:
+        return
+    if collection_name in _tracked_revisions:
+        from pymongo import ReturnDocument
+        doc = await async_db[REVISIONS_COLLECTION].find_one_and_update(
+            {"_id": collection_name}, _revision_update(), upsert=True, return_document=ReturnDocument.AFTER
+        )
+        _remember_revision(collection_name, doc)
+    for op, docs in changes:
+        _notify_write(collection_name, op, docs)
+
+# Slow-query log: every helper below is timed (including the wait for a pooled
+# connection) and calls slower than the threshold are recorded in
+# slowlog.slow_queries. Reads are also explained in the background, through
+# the same client as the helper (a loop task for the async helpers, a thread
+# for the blocking ones), so explains never open a second connection pool.
+def _sort_label(sort: Optional[list]) -> Optional[List[str]]:
+    return [f"-{field}" if direction == -1 else field for field, direction in sort] if sort else None
+
+def _explain_find(collection_name: str, filter_dict: dict = None, limit: int = None, sort: list = None, **_) -> dict:
+    command = {"find": collection_name, "filter": filter_dict or {}}
+    if sort:
+        command["sort"] = dict(sort)
+    if limit:
+        command["limit"] = limit
+    return command
+
+def _explain_page(collection_name: str, filter_dict: dict = None, limit: int = None, after: str = None, sort_field: str = None, direction: int = 1, **_) -> dict:
+    query, sort = paged_query(filter_dict, after, sort_field, direction)
+    return _explain_find(collection_name, query, limit + 1 if limit else None, sort)
+
+def _explain_aggregate(collection_name: str, pipeline: List[dict], **_) -> dict:
+    return {"aggregate": collection_name, "pipeline": pipeline, "cursor": {}}
+
+def _explain_text_search(collection_name: str, query: str, limit: int, **_) -> dict:
+    return {"find": collection_name, "filter": {"$text": {"$search": query}}, "limit": limit}
+
+def _explain_in_background(entry: dict, command: dict):
+    try:
+        result = get_db().command({"explain": command, "verbosity": "executionStats"})
+        summary = summarize_explain(result)
+    except Exception as e:
+        # e.g. mongomock, which has no explain command
+        summary = {"error": str(e)}
+    slow_queries.attach_explain(entry, summary)
+
+# Running explain tasks, referenced until done so they are not collected
+_explain_tasks = set()
+
+async def _explain_async(entry: dict, command: dict):
+    try:
+        result = await async_db.command({"explain": command, "verbosity": "executionStats"})
+        summary = summarize_explain(result)
+    except Exception as e:
+        summary = {"error": str(e)}
+    slow_queries.attach_explain(entry, summary)
+
+def _start_explain(entry: dict, command: dict, asynchronous: bool):
+    if not asynchronous:
+        threading.Thread(target=_explain_in_background, args=(entry, command), name="slow-query-explain", daemon=True).start()
+        return
+    try:
+        task = asyncio.get_running_loop().create_task(_explain_async(entry, command))
+    except RuntimeError:
+        # No running loop (e.g. a stream finalized at shutdown)
+        return
+    _explain_tasks.add(task)
+    task.add_done_callback(_explain_tasks.discard)
 
-    result = db[collection_name].insert_one(data_dict)
+def _timed(operation: str, explain: Callable[..., dict] = None):
+    """Decorator reporting slow calls of a helper to the slow-query log.
+
+    `explain` builds the command to explain from the call's arguments (reads
+    only). Arguments are only inspected for calls over the threshold.
+    Async generators are reported once exhausted or closed, with the time
+    spent waiting for documents (not for the consumer) and how many were read.
+    """
+    def decorate(func):
+        signature = inspect.signature(func)
+        asynchronous = asyncio.iscoroutinefunction(func) or inspect.isasyncgenfunction(func)
+
+        def report(args, kwargs, elapsed_ms, result, error):
+            if elapsed_ms < slow_queries.threshold_ms:
+                return
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = bound.arguments
+            command = explain(**params) if explain is not None else None
+            if command and "filter" in command:
+                filter_dict = command["filter"]
+            elif params.get("pipeline"):
+                filter_dict = params["pipeline"][0].get("$match")
+            else:
+                filter_dict = params.get("filter_dict") or ({"_id": None} if "document_id" in params else None)
+            sort = params.get("sort") or ([(params["sort_field"], params.get("direction", 1))] if params.get("sort_field") else None)
+            entry = slow_queries.record(
+                operation,
+                params["collection_name"],
+                elapsed_ms,
+                filter_dict,
+                None if error else document_count(result),
+                error,
+                limit=params.get("limit"),
+                sort=_sort_label(sort),
+                pipeline=[next(iter(stage)) for stage in params["pipeline"]] if params.get("pipeline") else None,
+            )
+            if command is not None and error is None and slow_queries.should_explain(entry):
+                _start_explain(entry, command, asynchronous)
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                rows = func(*args, **kwargs)
+                waited, count, error = 0.0, 0, None
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        try:
+                            item = await rows.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        except Exception as e:
+                            error = type(e).__name__
+                            raise
+                        finally:
+                            waited += time.perf_counter() - started
+                        count += 1
+                        yield item
+                finally:
+                    await rows.aclose()
+                    report(args, kwargs, waited * 1000, None if error else count, error)
+        elif asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    report(args, kwargs, (time.perf_counter() - started) * 1000, None, type(e).__name__)
+                    raise
+                report(args, kwargs, (time.perf_counter() - started) * 1000, result, None)
+                return result
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    report(args, kwargs, (time.perf_counter() - started) * 1000, None, type(e).__name__)
+                    raise
+                report(args, kwargs, (time.perf_counter() - started) * 1000, result, None)
+                return result
+        return wrapper
+    return decorate
+
+# Helper functions for common database operations
+@_timed("insert_one")
+def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    doc = _prepare_document(data)
+    result = db[collection_name].insert_one(doc)
+    _written(collection_name, "insert", [doc])
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
+def _bulk_results(docs: List[dict], error: Optional["BulkWriteError"]) -> Tuple[List[dict], List[dict]]:
+    """Per-item report for an unordered insert_many in input order, plus the inserted documents"""
+    failures = {}
+    if error is not None:
+        for write_error in error.details.get("writeErrors", []):
+            failures[write_error["index"]] = write_error.get("errmsg", "write error")
+    results = []
+    for index, doc in enumerate(docs):
+        if index in failures:
+            results.append({"index": index, "ok": False, "error": failures[index]})
+        else:
+            results.append({"index": index, "ok": True, "id": str(doc["_id"])})
+    inserted = [doc for index, doc in enumerate(docs) if index not in failures]
+    return results, inserted
+
+@_timed("insert_many")
+def create_documents(collection_name: str, items: Iterable[Union[BaseModel, dict]]) -> List[dict]:
+    """Insert many documents in as few round trips as possible.
+
+    Uses an unordered insert_many so one bad document does not stop the
+    rest; returns one {"index", "ok", "id" | "error"} entry per item.
+    """
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    docs = [_prepare_document(item) for item in items]
+    if not docs:
+        return []
+    from pymongo.errors import BulkWriteError
+
+    error = None
+    try:
+        db[collection_name].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        error = e
+    results, inserted = _bulk_results(docs, error)
+    _written(collection_name, "insert", inserted)
+    return results
+
+_MISSING = object()
+
+def _upsert_plan(items: Iterable[Union[BaseModel, dict]], key_fields: List[str]) -> Tuple[dict, List[dict]]:
+    """Documents to upsert keyed by their natural key (last one wins), and their key filters"""
+    planned = {}
+    for item in items:
+        doc = _prepare_document(item)
+        key = {field: doc.get(field) for field in key_fields}
+        planned[json.dumps(key, sort_keys=True, default=str)] = doc
+    return planned, [{field: doc.get(field) for field in key_fields} for doc in planned.values()]
+
+def _upsert_requests(planned: dict, existing: List[dict], key_fields: List[str]) -> Tuple[List["UpdateOne"], dict, List[dict]]:
+    """Write requests for the new and changed documents only.
+
+    New documents are inserted through $setOnInsert (so a racing insert of the
+    same key is a no-op rather than a duplicate) and changed ones get a $set of
+    the differing fields plus a new updated_at. Identical documents are left
+    alone, so re-sending the same data writes nothing.
+    Returns (requests, new documents by request index, changed documents with their _id).
+    """
+    from pymongo import UpdateOne
+
+    stored = {
+        json.dumps({field: doc.get(field) for field in key_fields}, sort_keys=True, default=str): doc
+        for doc in existing
+    }
+    requests, inserts, updates = [], {}, []
+    for key, doc in planned.items():
+        current = stored.get(key)
+        if current is None:
+            inserts[len(requests)] = doc
+            requests.append(UpdateOne({field: doc.get(field) for field in key_fields}, {"$setOnInsert": doc}, upsert=True))
+            continue
+        changed = {
+            field: value for field, value in doc.items()
+            if field not in ("created_at", "updated_at") and current.get(field, _MISSING) != value
+        }
+        if changed:
+            changed["updated_at"] = doc["updated_at"]
+            requests.append(UpdateOne({"_id": current["_id"]}, {"$set": changed}))
+            updates.append(dict(changed, _id=current["_id"]))
+    return requests, inserts, updates
+
+def _upsert_counts(total: int, result) -> dict:
+    inserted = result.upserted_count if result is not None else 0
+    modified = result.modified_count if result is not None else 0
+    return {
+        "inserted": inserted,
+        "matched": total - inserted,
+        "modified": modified,
+        "unchanged": total - inserted - modified,
+    }
+
+def _upserted(inserts: dict, result) -> List[dict]:
+    """The new documents that were actually inserted, with their _id"""
+    return [dict(inserts[index], _id=_id) for index, _id in result.upserted_ids.items()] if result is not None else []
+
+@_timed("bulk_upsert")
+def upsert_documents(collection_name: str, items: Iterable[Union[BaseModel, dict]], key_fields: List[str]) -> dict:
+    """Idempotently insert-or-update documents keyed on `key_fields`.
+
+    One find reads the stored versions, then one bulk_write inserts the new
+    documents and updates only the fields that changed (touching updated_at).
+    """
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    planned, keys = _upsert_plan(items, key_fields)
+    if not planned:
+        return _upsert_counts(0, None)
+    existing = list(db[collection_name].find({"$or": keys}, {"created_at": 0, "updated_at": 0}))
+    requests, inserts, updates = _upsert_requests(planned, existing, key_fields)
+    result = db[collection_name].bulk_write(requests, ordered=False) if requests else None
+    counts = _upsert_counts(len(planned), result)
+    _written(collection_name, "insert", _upserted(inserts, result), ("update", updates))
+    return counts
+
+def _id_filter(document_id: Union[str, ObjectId]) -> dict:
+    """{"_id": ObjectId}; raises ValueError for malformed ids"""
+    try:
+        return {"_id": ObjectId(document_id)}
+    except (InvalidId, TypeError):
+        raise ValueError(f"Invalid document id: {document_id!r}")
+
+def _update_spec(set_fields: Optional[dict], inc: Optional[dict], push: Optional[dict]) -> dict:
+    """One update document combining the operators; updated_at is always set"""
+    update = {"$set": dict(set_fields or {}, updated_at=datetime.now(timezone.utc))}
+    if inc:
+        update["$inc"] = inc
+    if push:
+        update["$push"] = push
+    return update
+
+@_timed("update_one")
+def update_document(
+    collection_name: str,
+    document_id: Union[str, ObjectId],
+    set_fields: dict = None,
+    inc: dict = None,
+    push: dict = None,
+    return_document: bool = False,
+):
+    """Atomically apply $set / $inc / $push to one document in a single round trip.
+
+    Returns whether the document existed, or with return_document=True the
+    updated document (None if it does not exist).
+    """
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    query = _id_filter(document_id)
+    update = _update_spec(set_fields, inc, push)
+    if return_document:
+        from pymongo import ReturnDocument
+
+        doc = db[collection_name].find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+        if doc is not None:
+            _written(collection_name, "update", [doc])
+        return doc
+    result = db[collection_name].update_one(query, update)
+    if result.matched_count:
+        _written(collection_name, "update", [dict(query, **update["$set"])])
+    return result.matched_count > 0
+
+@_timed("update_one")
+def update_matching(
+    collection_name: str,
+    filter_dict: dict,
+    set_fields: dict = None,
+    inc: dict = None,
+    push: dict = None,
+    upsert: bool = False,
+) -> bool:
+    """Like update_document for the first document matching a filter.
+
+    With upsert=True a missing document is created from the filter's equality
+    fields (created_at is set on insert). Returns whether a document was
+    matched or inserted.
+    """
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    update = _update_spec(set_fields, inc, push)
+    if upsert:
+        update["$setOnInsert"] = {"created_at": update["$set"]["updated_at"]}
+    result = db[collection_name].update_one(filter_dict, update, upsert=upsert)
+    if result.matched_count or result.upserted_id is not None:
+        if result.upserted_id is not None:
+            _written(collection_name, "insert", [dict(filter_dict, **update["$set"], _id=result.upserted_id)])
+        else:
+            _written(collection_name, "update", [dict(filter_dict, **update["$set"])])
+        return True
+    return False
+
+@_timed("increment")
+def increment_counters(collection_name: str, document_id: Union[str, ObjectId], counters: dict) -> Optional[dict]:
+    """$inc hot counters server-side and return their new values (None if the document does not exist).
+
+    Counters are not part of cached responses, so increments leave
+    updated_at and the collection revision alone; bumping them on every
+    view would defeat the response cache.
+    """
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    from pymongo import ReturnDocument
+
+    return db[collection_name].find_one_and_update(
+        _id_filter(document_id),
+        {"$inc": counters},
+        projection={field: 1 for field in counters},
+        return_document=ReturnDocument.AFTER,
+    )
+
+@_timed("delete_one")
+def delete_document(collection_name: str, document_id: Union[str, ObjectId]) -> bool:
+    """Delete one document by id; False if it did not exist"""
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    query = _id_filter(document_id)
+    result = db[collection_name].delete_one(query)
+    if result.deleted_count:
+        _written(collection_name, "delete", [query])
+    return result.deleted_count > 0
+
+@_timed("delete_many")
+def delete_documents(collection_name: str, filter_dict: dict) -> int:
+    """Delete every document matching a filter; returns how many were deleted"""
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = db[collection_name].delete_many(filter_dict)
+    if result.deleted_count:
+        _written(collection_name, "delete", [filter_dict])
+    return result.deleted_count
+
+@_timed("find", explain=_explain_find)
+def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None, sort: list = None):
     """Get documents from collection"""
+    db = get_db()
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+
+    cursor = db[collection_name].find(filter_dict or {}, projection)
+    if sort:
+        cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(limit)
-    
+
     return list(cursor)
+
+# Async helpers (Motor) for use inside the event loop
+async def connect_async_db():
+    """Create the Motor client on the running event loop (call on app startup)"""
+    global _async_client, async_db
+    database_url, database_name = _database_settings()
+    if async_db is not None or not (database_url and database_name):
+        return async_db
+
+    if _is_mock_url(database_url):
+        from mongomock_motor import AsyncMongoMockClient
+        # Share the in-process store with the blocking client
+        connect_db()
+        _async_client = AsyncMongoMockClient(mock_mongo_client=_client)
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        _async_client = AsyncIOMotorClient(database_url, **_client_options())
+    async_db = _async_client[database_name]
+    return async_db
+
+async def ping_async(timeout: float) -> None:
+    """Round trip to the server; raises if it is unreachable or slower than `timeout` seconds"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    await asyncio.wait_for(async_db.command("ping"), timeout)
+
+async def close_async_db():
+    """Close the Motor client and release its pool (call on app shutdown)"""
+    global _async_client, async_db
+    database_url, _ = _database_settings()
+    if _async_client is not None and not _is_mock_url(database_url or ""):
+        _async_client.close()
+    _async_client = None
+    async_db = None
+
+@_timed("insert_one")
+async def create_document_async(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp without blocking the event loop"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    doc = _prepare_document(data)
+    result = await async_db[collection_name].insert_one(doc)
+    await _written_async(collection_name, "insert", [doc])
+    return str(result.inserted_id)
+
+@_timed("insert_many")
+async def create_documents_async(collection_name: str, items: Iterable[Union[BaseModel, dict]]) -> List[dict]:
+    """Async variant of create_documents"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    docs = [_prepare_document(item) for item in items]
+    if not docs:
+        return []
+    from pymongo.errors import BulkWriteError
+
+    error = None
+    try:
+        await async_db[collection_name].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        error = e
+    results, inserted = _bulk_results(docs, error)
+    await _written_async(collection_name, "insert", inserted)
+    return results
+
+@_timed("bulk_upsert")
+async def upsert_documents_async(collection_name: str, items: Iterable[Union[BaseModel, dict]], key_fields: List[str]) -> dict:
+    """Async variant of upsert_documents"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    planned, keys = _upsert_plan(items, key_fields)
+    if not planned:
+        return _upsert_counts(0, None)
+    existing = await async_db[collection_name].find({"$or": keys}, {"created_at": 0, "updated_at": 0}).to_list(None)
+    requests, inserts, updates = _upsert_requests(planned, existing, key_fields)
+    result = await async_db[collection_name].bulk_write(requests, ordered=False) if requests else None
+    counts = _upsert_counts(len(planned), result)
+    await _written_async(collection_name, "insert", _upserted(inserts, result), ("update", updates))
+    return counts
+
+@_timed("update_one")
+async def update_document_async(
+    collection_name: str,
+    document_id: Union[str, ObjectId],
+    set_fields: dict = None,
+    inc: dict = None,
+    push: dict = None,
+    return_document: bool = False,
+):
+    """Async variant of update_document"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    query = _id_filter(document_id)
+    update = _update_spec(set_fields, inc, push)
+    if return_document:
+        from pymongo import ReturnDocument
+
+        doc = await async_db[collection_name].find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+        if doc is not None:
+            await _written_async(collection_name, "update", [doc])
+        return doc
+    result = await async_db[collection_name].update_one(query, update)
+    if result.matched_count:
+        await _written_async(collection_name, "update", [dict(query, **update["$set"])])
+    return result.matched_count > 0
+
+@_timed("increment")
+async def increment_counters_async(collection_name: str, document_id: Union[str, ObjectId], counters: dict) -> Optional[dict]:
+    """Async variant of increment_counters"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    from pymongo import ReturnDocument
+
+    return await async_db[collection_name].find_one_and_update(
+        _id_filter(document_id),
+        {"$inc": counters},
+        projection={field: 1 for field in counters},
+        return_document=ReturnDocument.AFTER,
+    )
+
+@_timed("delete_one")
+async def delete_document_async(collection_name: str, document_id: Union[str, ObjectId]) -> bool:
+    """Async variant of delete_document"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    query = _id_filter(document_id)
+    result = await async_db[collection_name].delete_one(query)
+    if result.deleted_count:
+        await _written_async(collection_name, "delete", [query])
+    return result.deleted_count > 0
+
+@_timed("find_revision")
+async def get_revision_async(collection_name: str) -> Tuple[int, Optional[datetime]]:
+    """Current (revision, last write time) of a tracked collection; (0, None) if never written
+
+    Served from this worker's copy while it is younger than REVISION_TTL_SECONDS.
+    """
+    cached = _revision_cache.get(collection_name)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    doc = await async_db[REVISIONS_COLLECTION].find_one({"_id": collection_name})
+    return _remember_revision(collection_name, doc)
+
+@_timed("create_index")
+async def _create_index_async(collection_name: str, keys: list, options: dict):
+    await async_db[collection_name].create_index(keys, **options)
+
+async def ensure_indexes_async(registry: dict):
+    """Create every index in the registry (see schemas.INDEXES); safe to call repeatedly"""
+    if async_db is None:
+        return
+    from pymongo.errors import ConnectionFailure
+
+    for collection_name, specs in registry.items():
+        for keys, options in specs:
+            try:
+                await _create_index_async(collection_name, keys, options)
+            except ConnectionFailure as e:
+                # Server unreachable: don't wait out a timeout per index; /readyz reports it
+                logger.warning("Skipping index creation, database unreachable: %s", e)
+                return
+            except Exception as e:
+                # e.g. existing duplicates blocking a unique index; keep starting up
+                logger.warning("Could not create index %s on %s: %s", keys, collection_name, e)
+
+@_timed("index_stats")
+async def get_index_stats_async(collection_name: str) -> List[dict]:
+    """Per-index usage counters from $indexStats (ops is None when unsupported)"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    collection = async_db[collection_name]
+    try:
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+    except Exception:
+        # Stand-ins such as mongomock do not implement $indexStats
+        info = await collection.index_information()
+        return [{"name": name, "key": dict(spec["key"]), "ops": None, "since": None} for name, spec in info.items()]
+    return [
+        {
+            "name": s["name"],
+            "key": dict(s["key"]),
+            "ops": s["accesses"]["ops"],
+            "since": s["accesses"]["since"],
+        }
+        for s in stats
+    ]
+
+@_timed("find", explain=_explain_find)
+async def get_documents_async(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection without blocking the event loop"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    cursor = async_db[collection_name].find(filter_dict or {}, projection)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    return await cursor.to_list(length=limit or None)
+
+@_timed("find_stream", explain=_explain_find)
+async def iter_documents_async(
+    collection_name: str,
+    filter_dict: dict = None,
+    limit: int = None,
+    projection: dict = None,
+    batch_size: int = 500,
+    sort: list = None,
+) -> AsyncIterator[dict]:
+    """Yield documents one at a time, fetching them from the server in batches"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    cursor = async_db[collection_name].find(filter_dict or {}, projection).batch_size(batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    async for doc in cursor:
+        yield doc
+
+@_timed("aggregate", explain=_explain_aggregate)
+async def aggregate_async(collection_name: str, pipeline: List[dict]) -> List[dict]:
+    """Run an aggregation pipeline in the database and return its output documents"""
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return await async_db[collection_name].aggregate(pipeline).to_list(length=None)
+
+@_timed("text_search", explain=_explain_text_search)
+async def text_search_async(collection_name: str, query: str, limit: int, projection: dict = None) -> List[dict]:
+    """Top `limit` matches for a $text query, best first, each with a `score` field.
+
+    Requires the collection's text index (raises OperationFailure without
+    one); not available on the mongomock stand-in.
+    """
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    projection = dict(projection or {"_id": 0})
+    projection["score"] = {"$meta": "textScore"}
+    cursor = (
+        async_db[collection_name]
+        .find({"$text": {"$search": query}}, projection)
+        .sort([("score", {"$meta": "textScore"})])
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
+
+def watch_async(collection_names: List[str], operations: List[str]):
+    """Change stream over the given collections (async context manager + iterator).
+
+    Updates carry the current document (fullDocument="updateLookup").
+    Opening it raises OperationFailure on servers without change streams
+    (standalone mongod) and NotImplementedError on mongomock.
+    """
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    pipeline = [{"$match": {"ns.coll": {"$in": collection_names}, "operationType": {"$in": operations}}}]
+    return async_db.watch(pipeline, full_document="updateLookup")
+
+# Keyset pagination
+def encode_cursor(doc: dict, sort_field: str = None, direction: int = 1) -> str:
+    """Turn the last document of a page into an opaque cursor token.
+
+    The token carries the document's _id and, for sorted listings, the sort
+    field, direction and the document's value for it, so the next page can
+    resume with a range query instead of skipping.
+    """
+    payload = {"id": str(doc["_id"])}
+    if sort_field:
+        payload.update({"s": sort_field, "d": direction, "k": doc.get(sort_field)})
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str, sort_field: str = None, direction: int = 1) -> dict:
+    """Inverse of encode_cursor; raises ValueError for malformed tokens or a changed sort"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        payload["id"] = ObjectId(payload["id"])
+    except (ValueError, TypeError, KeyError, InvalidId):
+        raise ValueError("Invalid cursor")
+    if payload.get("s") != sort_field or (sort_field and payload.get("d") != direction):
+        raise ValueError("Cursor does not match the requested sort")
+    return payload
+
+def _keyset_filter(after: dict) -> dict:
+    """Documents strictly after the cursor position in (sort field, _id) order"""
+    op = "$gt" if after.get("d", 1) == 1 else "$lt"
+    field = after.get("s")
+    if not field:
+        return {"_id": {op: after["id"]}}
+
+    value = after["k"]
+    same_value = {field: value, "_id": {op: after["id"]}}
+    if value is None:
+        # Nulls sort first ascending and last descending
+        return {"$or": [{field: {"$ne": None}}, same_value]} if op == "$gt" else same_value
+    clauses = [{field: {op: value}}, same_value]
+    if op == "$lt":
+        clauses.append({field: None})
+    return {"$or": clauses}
+
+def paged_query(filter_dict: dict = None, after: str = None, sort_field: str = None, direction: int = 1) -> Tuple[dict, list]:
+    """Combine a filter with a keyset cursor; returns the query and its matching sort spec"""
+    query = dict(filter_dict or {})
+    if after:
+        keyset = _keyset_filter(decode_cursor(after, sort_field, direction))
+        query = {"$and": [query, keyset]} if query else keyset
+    sort = [(sort_field, direction), ("_id", direction)] if sort_field else [("_id", 1)]
+    return query, sort
+
+def build_projection(fields: Optional[Iterable[str]]) -> dict:
+    """Mongo projection for the requested fields, always excluding _id"""
+    projection = {"_id": 0}
+    for field in fields or []:
+        projection[field] = 1
+    return projection
+
+@_timed("find_page", explain=_explain_page)
+async def get_page_async(
+    collection_name: str,
+    filter_dict: dict = None,
+    limit: int = None,
+    after: str = None,
+    fields: Optional[List[str]] = None,
+    sort_field: str = None,
+    direction: int = 1,
+) -> Tuple[List[dict], Optional[str]]:
+    """Get one page of documents, plus the cursor for the next page.
+
+    Documents are ordered by `sort_field` (then _id), or by _id alone. Only
+    `limit` documents are read per call, so memory and latency stay
+    proportional to the page size. Each document's _id is returned as a
+    string `id`, the key of the PATCH/DELETE routes.
+    """
+    if async_db is None:
+        raise Exception("Async database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    query, sort = paged_query(filter_dict, after, sort_field, direction)
+
+    projection = None
+    if fields:
+        projection = build_projection(fields)
+        projection["_id"] = 1
+        if sort_field:
+            # Needed to build the next cursor
+            projection[sort_field] = 1
+
+    cursor = async_db[collection_name].find(query, projection).sort(sort)
+    if limit:
+        # Fetch one extra document to know whether another page exists
+        cursor = cursor.limit(limit + 1)
+    docs = await cursor.to_list(length=None)
+
+    next_cursor = None
+    if limit and len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field, direction)
+    for d in docs:
+        d["id"] = str(d.pop("_id"))
+        if fields and sort_field and sort_field not in fields:
+            d.pop(sort_field, None)
+    return docs, next_cursor
@@ -0,0 +1,86 @@
+"""
+Health Checks
+
+/healthz answers from memory only. /readyz reports the last result of a
+database ping that runs in the background every READINESS_INTERVAL_SECONDS,
+so probes never wait on or add load to Mongo. A result older than
+READINESS_MAX_AGE_SECONDS (e.g. the refresher died) is refreshed inline.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from database import ping_async
+
+logger = logging.getLogger(__name__)
+
+READINESS_INTERVAL_SECONDS = float(os.getenv("READINESS_INTERVAL_SECONDS", "5"))
+READINESS_TIMEOUT_SECONDS = float(os.getenv("READINESS_TIMEOUT_SECONDS", "1"))
+READINESS_MAX_AGE_SECONDS = float(os.getenv("READINESS_MAX_AGE_SECONDS", "15"))
+
+
+class ReadinessProbe:
+    """Cached result of a periodic database ping"""
+
+    def __init__(self, interval: float, timeout: float, max_age: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.max_age = max_age
+        self.ready = False
+        self.error: Optional[str] = "not checked yet"
+        self.latency_ms: Optional[float] = None
+        self.checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    async def check(self) -> bool:
+        start = time.perf_counter()
+        try:
+            await ping_async(self.timeout)
+            self.ready, self.error = True, None
+        except asyncio.TimeoutError:
+            self.ready, self.error = False, f"ping timed out after {self.timeout}s"
+        except Exception as e:
+            self.ready, self.error = False, str(e)[:200]
+        self.latency_ms = round((time.perf_counter() - start) * 1000, 3)
+        self.checked_at = time.monotonic()
+        return self.ready
+
+    async def _refresh_forever(self):
+        while not self._stopping.is_set():
+            await self.check()
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._refresh_forever())
+
+    async def stop(self):
+        # Signalled rather than cancelled: on Python < 3.12 wait_for() inside
+        # the ping can swallow a cancellation that races with its completion
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def status(self) -> dict:
+        age = time.monotonic() - self.checked_at
+        if age > self.max_age:
+            await self.check()
+            age = 0.0
+        return {
+            "ready": self.ready,
+            "database": "ok" if self.ready else self.error,
+            "ping_ms": self.latency_ms,
+            "checked_seconds_ago": round(age, 3),
+        }
+
+
+readiness = ReadinessProbe(READINESS_INTERVAL_SECONDS, READINESS_TIMEOUT_SECONDS, READINESS_MAX_AGE_SECONDS)
@@ -1,85 +1,512 @@
+import hashlib
+import json
 import os
-from fastapi import FastAPI, HTTPException
+import orjson
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from typing import List, Optional, Type
 
-from database import create_document, get_documents, db
-from schemas import Batmobile, Gadget
+from database import (
+    create_document_async,
+    create_documents_async,
+    upsert_documents_async,
+    update_document_async,
+    delete_document_async,
+    increment_counters_async,
+    ensure_indexes_async,
+    get_index_stats_async,
+    get_page_async,
+    iter_documents_async,
+    build_projection,
+    paged_query,
+    add_write_listener,
+    get_revision_async,
+    track_revisions,
+    aggregate_async,
+    connect_async_db,
+    close_async_db,
+    close_db,
+)
+from schemas import Batmobile, BatmobileRow, BatmobileUpdate, Gadget, GadgetRow, GadgetUpdate, NATURAL_KEYS, INDEXES
+from cache import response_cache
+from compression import CompressionMiddleware, EncodedBody, encoded_response
+from ratelimit import RateLimitMiddleware, limiter_stats
+from search import search_catalog
+from changes import catalog_changes
+from batch_writer import close_all_writers, writer_stats
+from health import readiness
+from slowlog import slow_queries
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, render_metrics
 
 app = FastAPI(title="Batman Gadgets & Batmobiles API")
 
+# Innermost, so rejections still get CORS headers and preflights are never limited
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser clients read the next-page cursor and the caching headers
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", "Retry-After"],
 )
 
+# Compresses responses that were not compressed from the cache (see compression.py)
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so the timings include every other middleware
+app.add_middleware(MetricsMiddleware)
+
+# Any write through the database helpers drops that collection's cached pages
+add_write_listener(response_cache.invalidate)
+# Cached and ETagged collections; writes to the others skip the revision bump
+track_revisions(["batmobile", "gadget"])
+
+@app.on_event("startup")
+async def startup():
+    await connect_async_db()
+    await ensure_indexes_async(INDEXES)
+    readiness.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await readiness.stop()
+    await catalog_changes.close()
+    # Drain write-behind queues before the database clients go away
+    close_all_writers()
+    await close_async_db()
+    close_db()
+
 @app.get("/")
 def read_root():
     return {"message": "Batman API running"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/api/hello")
 def hello():
     return {"message": "Hello from the backend API!"}
 
-@app.get("/test")
-def test_database():
-    """Test endpoint to check if database is available and accessible"""
-    response = {
-        "backend": "✅ Running",
-        "database": "❌ Not Available",
-        "database_url": None,
-        "database_name": None,
-        "connection_status": "Not Connected",
-        "collections": []
+# -------------------- Health --------------------
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving; no I/O"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: last background database ping; 503 while Mongo is unreachable"""
+    status = await readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/test", deprecated=True)
+async def test_database():
+    """Kept for existing probes; same as /readyz"""
+    return await readyz()
+
+# -------------------- Admin --------------------
+@app.get("/api/admin/indexes")
+async def index_stats():
+    """Index usage per collection; indexes with ops == 0 are never used"""
+    try:
+        return {name: await get_index_stats_async(name) for name in INDEXES}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admin/cache")
+def cache_stats():
+    return response_cache.stats()
+
+@app.get("/api/admin/writers")
+def batch_writer_stats():
+    """Queue depth, flush latency and dropped events of the write-behind writers"""
+    return writer_stats()
+
+@app.get("/api/admin/slow-queries")
+def slow_query_log(limit: int = Query(50, ge=1, le=1000)):
+    """Recent database helper calls over SLOW_QUERY_MS, newest first, with explain() summaries"""
+    return {**slow_queries.stats(), "entries": slow_queries.entries(limit)}
+
+@app.get("/api/admin/limits")
+def rate_limit_stats():
+    """Rate and concurrency limit settings and rejection counts"""
+    return limiter_stats()
+
+# -------------------- Listing helpers --------------------
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """Validate a comma-separated `fields=` projection against the model"""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+def sortable_fields(collection_name: str) -> set:
+    """Fields with a (field, _id) index in the registry, the order sorted pages are read in"""
+    return {
+        keys[0][0]
+        for keys, _ in INDEXES.get(collection_name, [])
+        if len(keys) == 2 and keys[1][0] == "_id" and keys[0][1] in (1, -1) and keys[0][1] == keys[1][1]
     }
+
+def parse_sort(sort: Optional[str], collection_name: str):
+    """`sort=field` or `sort=-field` -> (field, direction)"""
+    if not sort:
+        return None, 1
+    direction = -1 if sort.startswith("-") else 1
+    field = sort.lstrip("+-")
+    allowed = sortable_fields(collection_name)
+    if field not in allowed:
+        raise HTTPException(status_code=400, detail=f"Cannot sort on {field!r}; sortable fields: {', '.join(sorted(allowed))}")
+    return field, direction
+
+# Documents in the catalog collections were validated against their model
+# when written, so by default reads are serialized straight to JSON instead of
+# being re-validated row by row. TRUSTED_READS=0 restores full validation.
+TRUSTED_READS = os.getenv("TRUSTED_READS", "1") != "0"
+
+_list_adapters = {}
+
+def serialize_page(model: Type[BaseModel], docs: List[dict], projected: Optional[List[str]]) -> bytes:
+    """Render a page to JSON bytes"""
+    if projected:
+        # Partial documents cannot satisfy the full response model
+        return orjson.dumps(docs)
+    if TRUSTED_READS:
+        # Same shape as the validated output: the id, then every model field in order
+        fields = list(model.model_fields)
+        return orjson.dumps([{"id": d["id"], **{f: d.get(f) for f in fields}} for d in docs])
+    adapter = _list_adapters.get(model)
+    if adapter is None:
+        adapter = _list_adapters[model] = TypeAdapter(List[model])
+    validated = adapter.validate_python(docs)
+    return orjson.dumps([{"id": d["id"], **m.model_dump(mode="json")} for d, m in zip(docs, validated)])
+
+def make_etag(revision: int, cache_key: tuple) -> str:
+    """Weak validator for one query at one collection revision"""
+    digest = hashlib.sha1(repr(cache_key).encode()).hexdigest()[:16]
+    return f'W/"{revision}-{digest}"'
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the current version"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison: the W/ prefix is ignored on both sides
+        return "*" in candidates or etag.removeprefix("W/") in [c.removeprefix("W/") for c in candidates]
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+STREAM_CHUNK_BYTES = int(os.getenv("STREAM_CHUNK_BYTES", str(256 * 1024)))
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+def list_responses(row_model: Type[BaseModel]) -> dict:
+    """OpenAPI description of a list endpoint; the handlers return prebuilt Responses, so nothing is validated"""
+    return {200: {
+        "model": List[row_model],
+        "description": (
+            "One page of rows; the next page's cursor is in the X-Next-Cursor header. "
+            "With fields= each row only has `id` and the listed fields. "
+            "With stream=true (or Accept: application/x-ndjson) the rows are sent as NDJSON, one per line."
+        ),
+        "content": {NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}}},
+    }}
+
+def wants_stream(request: Request, stream: bool) -> bool:
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+async def ndjson_rows(collection_name: str, filter_dict: dict, limit: Optional[int], projection: dict, sort: list):
+    """Serialize documents to NDJSON as the cursor produces them, one chunk per cursor batch.
+
+    A chunk is also sent early once it reaches STREAM_CHUNK_BYTES, so wide
+    documents don't pile up; each chunk is one send (and one compressor flush).
+    """
+    rows = iter_documents_async(collection_name, filter_dict, limit, projection, STREAM_BATCH_SIZE, sort)
+    chunk, count = bytearray(), 0
+    async for doc in rows:
+        doc["id"] = str(doc.pop("_id"))
+        chunk += orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE)
+        count += 1
+        # Batch boundaries line up with the cursor's, so no row waits for the next getMore
+        if count == STREAM_BATCH_SIZE or len(chunk) >= STREAM_CHUNK_BYTES:
+            yield bytes(chunk)
+            chunk, count = bytearray(), 0
+    if chunk:
+        yield bytes(chunk)
+
+async def list_page(
+    collection_name: str,
+    model: Type[BaseModel],
+    request: Request,
+    filter_dict: dict,
+    limit: Optional[int],
+    cursor: Optional[str],
+    fields: Optional[str],
+    sort: Optional[str],
+    stream: bool = False,
+):
+    """Shared implementation of the paginated, filterable, projectable list endpoints
+
+    Pages hold DEFAULT_PAGE_SIZE documents unless a limit is given, at most
+    MAX_PAGE_SIZE. NDJSON streams are unbounded by default since they never
+    hold more than one batch in memory.
+    """
+    projected = parse_fields(fields, model)
+    sort_field, direction = parse_sort(sort, collection_name)
+    try:
+        # Validates the cursor against the requested sort
+        query, sort_spec = paged_query(filter_dict, cursor, sort_field, direction)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if wants_stream(request, stream):
+        # Rows come straight from the cursor; only the id and schema fields are projected
+        projection = build_projection(projected or list(model.model_fields))
+        projection["_id"] = 1
+        return StreamingResponse(
+            ndjson_rows(collection_name, query, limit, projection, sort_spec),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    elif limit > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must not exceed {MAX_PAGE_SIZE}; use stream=true to export more")
+
     try:
-        if db is not None:
-            response["database"] = "✅ Available"
-            response["database_url"] = "✅ Configured"
-            response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
-            response["connection_status"] = "Connected"
-            try:
-                collections = db.list_collection_names()
-                response["collections"] = collections[:10]
-                response["database"] = "✅ Connected & Working"
-            except Exception as e:
-                response["database"] = f"⚠️  Connected but Error: {str(e)[:50]}"
-        else:
-            response["database"] = "⚠️  Available but not initialized"
+        revision, last_modified = await get_revision_async(collection_name)
     except Exception as e:
-        response["database"] = f"❌ Error: {str(e)[:50]}"
+        raise HTTPException(status_code=500, detail=str(e))
 
-    response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-    response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
-    return response
+    # The revision makes cached pages and ETags follow writes from any worker
+    # (from other workers within REVISION_TTL_SECONDS)
+    cache_key = (revision, json.dumps(filter_dict, sort_keys=True, default=str), limit, cursor, tuple(projected or ()), sort)
+    headers = {"ETag": make_etag(revision, cache_key), "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if not_modified(request, headers["ETag"], last_modified):
+        return Response(status_code=304, headers=headers)
 
-# -------------------- Batmobiles --------------------
-@app.get("/api/batmobiles", response_model=List[Batmobile])
-def list_batmobiles(limit: Optional[int] = None):
+    cached = response_cache.get(collection_name, cache_key)
+    if cached is None:
+        generation = response_cache.generation(collection_name)
+        try:
+            # Trusted reads only fetch the schema's fields from Mongo
+            fetch_fields = projected or (list(model.model_fields) if TRUSTED_READS else None)
+            docs, next_cursor = await get_page_async(collection_name, filter_dict, limit, cursor, fetch_fields, sort_field, direction)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        # Cached with its compressed variants, so a page is compressed once per encoding
+        cached = (EncodedBody(serialize_page(model, docs, projected)), next_cursor)
+        response_cache.put(collection_name, cache_key, cached, generation)
+
+    body, next_cursor = cached
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return encoded_response(request, body, headers)
+
+# -------------------- Facets --------------------
+# collection -> (fields counted per distinct value, numeric field bucketed by decade)
+FACET_FIELDS = {
+    "batmobile": (["era", "media", "universe"], "year"),
+    "gadget": (["category"], None),
+}
+
+def facet_pipeline(count_fields: List[str], decade_field: Optional[str]) -> List[dict]:
+    """A single $facet stage computing every statistic in one pass over the collection"""
+    facets = {"total": [{"$count": "count"}]}
+    for field in count_fields:
+        facets[field] = [
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ]
+    if decade_field:
+        facets["decade"] = [
+            {"$match": {decade_field: {"$type": "number"}}},
+            {"$group": {"_id": {"$subtract": [f"${decade_field}", {"$mod": [f"${decade_field}", 10]}]}, "count": {"$sum": 1}}},
+            {"$sort": {"_id": 1}},
+        ]
+    return [{"$facet": facets}]
+
+def format_facets(result: dict) -> dict:
+    total = result.pop("total")
+    formatted = {"total": total[0]["count"] if total else 0}
+    for name, buckets in result.items():
+        formatted[name] = [
+            {"value": int(b["_id"]) if isinstance(b["_id"], float) else b["_id"], "count": b["count"]}
+            for b in buckets
+        ]
+    return formatted
+
+async def facets_response(collection_name: str, request: Request) -> Response:
+    """Facet counts for a collection, cached per revision and honouring conditional requests"""
+    try:
+        revision, last_modified = await get_revision_async(collection_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    cache_key = (revision, "facets")
+    headers = {"ETag": make_etag(revision, cache_key), "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if not_modified(request, headers["ETag"], last_modified):
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(collection_name, cache_key)
+    if cached is None:
+        generation = response_cache.generation(collection_name)
+        try:
+            result = await aggregate_async(collection_name, facet_pipeline(*FACET_FIELDS[collection_name]))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        cached = EncodedBody(orjson.dumps(format_facets(result[0])))
+        response_cache.put(collection_name, cache_key, cached, generation)
+    return encoded_response(request, cached, headers)
+
+# -------------------- Write helpers --------------------
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))
+
+async def bulk_insert(collection_name: str, items: List[BaseModel]):
+    """Insert a batch with one unordered insert_many and report per-item results"""
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per request")
+    try:
+        results = await create_documents_async(collection_name, items)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    inserted = sum(1 for r in results if r["ok"])
+    return {"ok": inserted == len(results), "inserted": inserted, "failed": len(results) - inserted, "results": results}
+
+async def seed_collection(collection_name: str, items: List[BaseModel]):
+    """Upsert seed data on its natural key so re-seeding is a no-op"""
+    try:
+        counts = await upsert_documents_async(collection_name, items, NATURAL_KEYS[collection_name])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"ok": True, **counts}
+
+async def patch_document(collection_name: str, model: Type[BaseModel], doc_id: str, changes: BaseModel):
+    """Apply the fields sent in a PATCH with one atomic $set and return the updated entry"""
+    fields = changes.model_dump(mode="json", exclude_unset=True)
+    if not fields:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    cleared = [f for f, v in fields.items() if v is None and model.model_fields[f].is_required()]
+    if cleared:
+        raise HTTPException(status_code=400, detail=f"Required fields cannot be null: {', '.join(cleared)}")
+    try:
+        doc = await update_document_async(collection_name, doc_id, set_fields=fields, return_document=True)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Another entry already has this name")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"ok": True, "id": doc_id, "document": {f: doc.get(f) for f in model.model_fields}}
+
+async def remove_document(collection_name: str, doc_id: str):
     try:
-        docs = get_documents("batmobile", {}, limit)
-        # Convert ObjectId to str-safe dict
-        for d in docs:
-            d.pop("_id", None)
-        return docs
+        deleted = await delete_document_async(collection_name, doc_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"ok": True}
+
+async def increment_counter(collection_name: str, doc_id: str, counter: str):
+    """Bump one server-side counter with $inc (no read-modify-write) and return its new value"""
+    try:
+        doc = await increment_counters_async(collection_name, doc_id, {counter: 1})
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"ok": True, "id": doc_id, counter: doc[counter]}
+
+# -------------------- Batmobiles --------------------
+@app.get("/api/batmobiles", responses=list_responses(BatmobileRow))
+async def list_batmobiles(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, description=f"Page size (default {DEFAULT_PAGE_SIZE}, at most {MAX_PAGE_SIZE}; streams are unbounded)"),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    era: Optional[str] = None,
+    media: Optional[str] = None,
+    universe: Optional[str] = None,
+    year_gte: Optional[int] = None,
+    year_lte: Optional[int] = None,
+    sort: Optional[str] = Query(None, description="Field to sort on, prefix with - for descending"),
+    stream: bool = False,
+):
+    filter_dict = {k: v for k, v in {"era": era, "media": media, "universe": universe}.items() if v is not None}
+    year_range = {op: v for op, v in {"$gte": year_gte, "$lte": year_lte}.items() if v is not None}
+    if year_range:
+        filter_dict["year"] = year_range
+    return await list_page("batmobile", Batmobile, request, filter_dict, limit, cursor, fields, sort, stream)
+
+@app.get("/api/batmobiles/facets")
+async def batmobile_facets(request: Request):
+    """Counts per era, media and universe plus a per-decade year histogram"""
+    return await facets_response("batmobile", request)
 
 @app.post("/api/batmobiles")
-def add_batmobile(b: Batmobile):
+async def add_batmobile(b: Batmobile):
     try:
-        doc_id = create_document("batmobile", b)
+        doc_id = await create_document_async("batmobile", b)
         return {"ok": True, "id": doc_id}
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Batmobile already exists")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/batmobiles/bulk")
+async def add_batmobiles_bulk(items: List[Batmobile]):
+    return await bulk_insert("batmobile", items)
+
+@app.patch("/api/batmobiles/{batmobile_id}")
+async def update_batmobile(batmobile_id: str, changes: BatmobileUpdate):
+    return await patch_document("batmobile", Batmobile, batmobile_id, changes)
+
+@app.delete("/api/batmobiles/{batmobile_id}")
+async def delete_batmobile(batmobile_id: str):
+    return await remove_document("batmobile", batmobile_id)
+
+@app.post("/api/batmobiles/{batmobile_id}/views")
+async def view_batmobile(batmobile_id: str):
+    return await increment_counter("batmobile", batmobile_id, "view_count")
+
+@app.post("/api/batmobiles/{batmobile_id}/likes")
+async def like_batmobile(batmobile_id: str):
+    return await increment_counter("batmobile", batmobile_id, "likes")
+
 # Seed many notable Batmobiles across films, animation, games
 @app.post("/api/seed/batmobiles")
-def seed_batmobiles():
+async def seed_batmobiles():
     seed: List[Batmobile] = [
         Batmobile(name="Serial Roadster", year=1943, media="Film Serial", title="Batman (1943)", universe="Film", era="Golden Age", description="Black 1939 Cadillac Series 61 used in the original serial.", image_url="https://images.unsplash.com/photo-1483721310020-03333e577078?q=80&w=1600&auto=format&fit=crop", specs=["Straight-8 engine", "Concealed plates"]),
         Batmobile(name="Serial Sedan", year=1949, media="Film Serial", title="Batman and Robin (1949)", universe="Film", era="Golden Age", description="Stock 1949 Mercury Convertible standing in as the Batmobile.", image_url="https://images.unsplash.com/photo-1502877338535-766e1452684a?q=80&w=1600&auto=format&fit=crop", specs=["Mercury V8", "Convertible"]),
@@ -109,36 +536,59 @@ def seed_batmobiles():
         Batmobile(name="Batman: Brave and the Bold", year=2008, media="Animation", title="Batman: The Brave and the Bold", universe="Animated", era="Animated", description="Retro-inspired convertible variants across episodes.", image_url="https://images.unsplash.com/photo-1503376780353-7e6692767b70?q=80&w=1600&auto=format&fit=crop"),
         Batmobile(name="Gotham TV Proto", year=2014, media="TV", title="Gotham", universe="TV", era="Prequel", description="Pre-Batman era vehicles hinting at future design.", image_url="https://images.unsplash.com/photo-1549924231-f129b911e442?q=80&w=1600&auto=format&fit=crop"),
     ]
-    inserted = 0
-    for item in seed:
-        try:
-            create_document("batmobile", item)
-            inserted += 1
-        except Exception:
-            pass
-    return {"ok": True, "inserted": inserted}
+    return await seed_collection("batmobile", seed)
 
 # -------------------- Gadgets --------------------
-@app.get("/api/gadgets", response_model=List[Gadget])
-def list_gadgets(limit: Optional[int] = None):
-    try:
-        docs = get_documents("gadget", {}, limit)
-        for d in docs:
-            d.pop("_id", None)
-        return docs
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/api/gadgets", responses=list_responses(GadgetRow))
+async def list_gadgets(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, description=f"Page size (default {DEFAULT_PAGE_SIZE}, at most {MAX_PAGE_SIZE}; streams are unbounded)"),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    category: Optional[str] = None,
+    sort: Optional[str] = Query(None, description="Field to sort on, prefix with - for descending"),
+    stream: bool = False,
+):
+    filter_dict = {"category": category} if category is not None else {}
+    return await list_page("gadget", Gadget, request, filter_dict, limit, cursor, fields, sort, stream)
+
+@app.get("/api/gadgets/facets")
+async def gadget_facets(request: Request):
+    """Counts per category"""
+    return await facets_response("gadget", request)
 
 @app.post("/api/gadgets")
-def add_gadget(g: Gadget):
+async def add_gadget(g: Gadget):
     try:
-        doc_id = create_document("gadget", g)
+        doc_id = await create_document_async("gadget", g)
         return {"ok": True, "id": doc_id}
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Gadget already exists")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/gadgets/bulk")
+async def add_gadgets_bulk(items: List[Gadget]):
+    return await bulk_insert("gadget", items)
+
+@app.patch("/api/gadgets/{gadget_id}")
+async def update_gadget(gadget_id: str, changes: GadgetUpdate):
+    return await patch_document("gadget", Gadget, gadget_id, changes)
+
+@app.delete("/api/gadgets/{gadget_id}")
+async def delete_gadget(gadget_id: str):
+    return await remove_document("gadget", gadget_id)
+
+@app.post("/api/gadgets/{gadget_id}/views")
+async def view_gadget(gadget_id: str):
+    return await increment_counter("gadget", gadget_id, "view_count")
+
+@app.post("/api/gadgets/{gadget_id}/likes")
+async def like_gadget(gadget_id: str):
+    return await increment_counter("gadget", gadget_id, "likes")
+
 @app.post("/api/seed/gadgets")
-def seed_gadgets():
+async def seed_gadgets():
     seed: List[Gadget] = [
         Gadget(name="Batarang", category="Offensive", description="Razor-edged bat-shaped throwing weapon; multiple variants including remote and explosive.", image_url="https://images.unsplash.com/photo-1599240516991-b40a6e2317f6?q=80&w=1600&auto=format&fit=crop"),
         Gadget(name="Grapnel Gun", category="Mobility", description="Compressed CO2 grappling launcher for rapid ascents and swings.", image_url="https://images.unsplash.com/photo-1612198185725-055f3e8bd477?q=80&w=1600&auto=format&fit=crop"),
@@ -155,16 +605,55 @@ def seed_gadgets():
         Gadget(name="Sticky Bomb Gun", category="Offensive", description="Launches adhesive explosive charges (The Dark Knight).", image_url="https://images.unsplash.com/photo-1511735111819-9a3f7709049c?q=80&w=1600&auto=format&fit=crop"),
         Gadget(name="Bat-sonar", category="Surveillance", description="Wide-area cell phone sonar mapping system (The Dark Knight).", image_url="https://images.unsplash.com/photo-1545665277-5937489579f3?q=80&w=1600&auto=format&fit=crop"),
     ]
-    inserted = 0
-    for item in seed:
-        try:
-            create_document("gadget", item)
-            inserted += 1
-        except Exception:
-            pass
-    return {"ok": True, "inserted": inserted}
+    return await seed_collection("gadget", seed)
+
+# -------------------- Search --------------------
+SEARCH_MAX_WINDOW = 1000
+
+@app.get("/api/search")
+async def search(
+    q: str = Query(..., min_length=1, description="Words to look for in names, titles, specs, categories and descriptions"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    if offset + limit > SEARCH_MAX_WINDOW:
+        raise HTTPException(status_code=400, detail=f"offset + limit must not exceed {SEARCH_MAX_WINDOW}")
+    try:
+        # One extra hit tells whether there is a next page
+        hits = await search_catalog(q, limit + 1, offset, {"batmobile": Batmobile, "gadget": Gadget})
+    except OperationFailure:
+        # Logged by search_collection
+        raise HTTPException(status_code=503, detail="Search is unavailable", headers={"Retry-After": "30"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    next_offset = offset + limit if len(hits) > limit else None
+    return {"q": q, "hits": hits[:limit], "next_offset": next_offset}
+
+# -------------------- Live changes --------------------
+@app.get("/api/stream/changes")
+async def stream_changes(collections: Optional[str] = Query(None, description="Comma-separated: batmobile,gadget (default both)")):
+    """Server-Sent Events feed of catalog inserts, updates and deletes"""
+    wanted = None
+    if collections:
+        wanted = {c.strip() for c in collections.split(",") if c.strip()}
+        unknown = wanted - set(catalog_changes.collections)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(sorted(unknown))}")
+    if catalog_changes.is_full():
+        raise HTTPException(status_code=503, detail="Too many change feed clients", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        catalog_changes.subscribe(wanted),
+        media_type="text/event-stream",
+        # Proxies such as nginx would otherwise buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/admin/changes")
+def change_feed_stats():
+    """Change feed source (change stream or in-process bus) and connected clients"""
+    return catalog_changes.stats()
 
 if __name__ == "__main__":
-    import uvicorn
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Same as `python serve.py`; see serve.py for the settings
+    from serve import main as serve
+    serve()
@@ -0,0 +1,236 @@
+"""
+Metrics
+
+Minimal Prometheus-style metrics kept in process memory and rendered in the
+text exposition format at GET /metrics:
+- HTTP: per-route latency histogram and in-flight requests (MetricsMiddleware)
+- Mongo: per-command/per-collection latency, failures and documents returned
+  (get_command_listener(), attached to every client in database.py)
+
+Each worker process keeps its own values; scrape every worker or aggregate
+in Prometheus.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_format(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        lines = self.header()
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _format(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_format(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -------------------- HTTP --------------------
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response body is sent",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template, including streamed bodies"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            # The router stores the matched route in the shared scope; using its
+            # path template keeps label cardinality bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], route_path, str(status["code"]))
+
+
+# -------------------- Mongo --------------------
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency as reported by the driver",
+    ("command", "collection"),
+)
+mongo_command_failures = Counter(
+    "mongo_command_failures_total",
+    "MongoDB commands that failed",
+    ("command", "collection"),
+)
+mongo_documents_returned = Histogram(
+    "mongo_documents_returned",
+    "Documents returned per find/getMore/aggregate batch",
+    ("command", "collection"),
+    buckets=COUNT_BUCKETS,
+)
+
+# Commands whose value is not a collection name
+_NON_COLLECTION_COMMANDS = {"getMore", "ping", "hello", "isMaster", "ismaster", "endSessions", "buildInfo", "listCollections"}
+
+
+class CommandRecorder:
+    """Records latency and result sizes of every command sent by a client"""
+
+    def __init__(self):
+        # (connection, request_id) -> (command, collection) of in-flight commands
+        self._pending: Dict[Tuple, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        name = event.command_name
+        if name == "getMore":
+            collection = event.command.get("collection", "")
+        elif name in _NON_COLLECTION_COMMANDS:
+            collection = ""
+        else:
+            value = event.command.get(name)
+            collection = value if isinstance(value, str) else ""
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (name, collection)
+
+    def _finish(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), (event.command_name, ""))
+
+    def succeeded(self, event):
+        name, collection = self._finish(event)
+        mongo_command_duration.observe(event.duration_micros / 1e6, name, collection)
+        cursor = event.reply.get("cursor") if isinstance(event.reply, dict) else None
+        if cursor:
+            batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+            if batch is not None:
+                mongo_documents_returned.observe(len(batch), name, collection)
+
+    def failed(self, event):
+        name, collection = self._finish(event)
+        mongo_command_duration.observe(event.duration_micros / 1e6, name, collection)
+        mongo_command_failures.inc(name, collection)
+
+
+_command_listener = None
+
+
+def get_command_listener():
+    """The shared pymongo CommandListener (pymongo is only imported when a client is created)"""
+    global _command_listener
+    if _command_listener is None:
+        from pymongo import monitoring
+
+        class MongoCommandListener(CommandRecorder, monitoring.CommandListener):
+            pass
+
+        _command_listener = MongoCommandListener()
+    return _command_listener
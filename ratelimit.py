@@ -0,0 +1,211 @@
+"""
+Rate Limiting
+
+In-process protection for the database-bound /api routes:
+- a token bucket per client and route class; a client that runs out gets
+  429 with Retry-After
+- a cap on concurrently served /api requests per worker, sized below the
+  Mongo connection pool; requests wait up to CONCURRENCY_QUEUE_SECONDS for
+  a slot and are then shed with 503 and Retry-After. Long-lived streams
+  under /api/stream/ hold no connection and are not counted.
+
+Clients are identified by their IP, or by their X-API-Key header when the key
+is listed in RATE_LIMIT_API_KEYS (unlisted keys would let a client mint fresh
+buckets at will). Route classes and their "rate,burst" limits (tokens per
+second, bucket size) are configured with RATE_LIMIT_READ, RATE_LIMIT_SEARCH,
+RATE_LIMIT_WRITE and RATE_LIMIT_SEED. Set RATE_LIMIT_ENABLED=0 to turn both
+limits off.
+
+State lives in each worker process, so with N workers a client can get up to
+N times the configured rate.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import orjson
+from starlette.datastructures import Headers
+
+from metrics import Counter
+
+DEFAULT_LIMITS = {
+    "read": "50,100",
+    "search": "10,20",
+    "write": "20,40",
+    "seed": "0.2,2",
+}
+
+http_requests_rejected = Counter(
+    "http_requests_rejected_total",
+    "Requests rejected by the rate or concurrency limits",
+    ("reason", "route_class"),
+)
+
+_middlewares = []
+
+LONG_LIVED_PREFIX = "/api/stream/"
+
+
+def _parse_limit(value: str) -> Tuple[float, float]:
+    rate, _, burst = value.partition(",")
+    rate, burst = float(rate), float(burst or rate)
+    if rate <= 0 or burst < 1:
+        raise ValueError(f"Invalid rate limit {value!r}: expected 'rate,burst' with rate > 0 and burst >= 1")
+    return rate, burst
+
+
+def limits_from_env() -> Dict[str, Tuple[float, float]]:
+    return {name: _parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}", default)) for name, default in DEFAULT_LIMITS.items()}
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Limit class of a request, or None for routes that are not limited"""
+    if not path.startswith("/api/"):
+        # Root, docs, metrics and health probes
+        return None
+    if path.startswith("/api/seed/"):
+        return "seed"
+    if path.startswith("/api/search"):
+        return "search"
+    if method in ("GET", "HEAD"):
+        return "read"
+    return "write"
+
+
+class TokenBuckets:
+    """Token buckets keyed by (client, route class), least recently used dropped first"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], max_clients: int = 10000):
+        self.limits = limits
+        self.max_clients = max_clients
+        # key -> [tokens, last refill time]
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client: str, route_class: str, now: Optional[float] = None) -> float:
+        """Spend one token; returns 0 when allowed, else seconds until a token is available"""
+        rate, burst = self.limits[route_class]
+        now = time.monotonic() if now is None else now
+        key = (client, route_class)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def _reject(status: int, detail: str, retry_after: float):
+    body = orjson.dumps({"detail": detail})
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+    ]
+    return {"type": "http.response.start", "status": status, "headers": headers}, {"type": "http.response.body", "body": body}
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying the per-client buckets and the concurrency cap"""
+
+    def __init__(
+        self,
+        app,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_concurrent: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        api_keys: Optional[set] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.app = app
+        self.enabled = os.getenv("RATE_LIMIT_ENABLED", "1") != "0" if enabled is None else enabled
+        self.buckets = TokenBuckets(limits or limits_from_env(), int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000")))
+        self.max_concurrent = max_concurrent or int(os.getenv("MAX_CONCURRENT_REQUESTS", "64"))
+        self.queue_timeout = float(os.getenv("CONCURRENCY_QUEUE_SECONDS", "0.5")) if queue_timeout is None else queue_timeout
+        if api_keys is None:
+            api_keys = {k.strip() for k in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if k.strip()}
+        self.api_keys = api_keys
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.rejected = {"rate": 0, "concurrency": 0}
+        _middlewares.append(self)
+
+    def client_id(self, scope) -> str:
+        api_key = Headers(scope=scope).get("x-api-key")
+        if api_key and api_key in self.api_keys:
+            return f"key:{api_key}"
+        client = scope.get("client")
+        return f"ip:{client[0]}" if client else "ip:unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        limit_class = route_class(scope["method"], scope["path"])
+        if limit_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = self.buckets.take(self.client_id(scope), limit_class)
+        if retry_after:
+            self.rejected["rate"] += 1
+            http_requests_rejected.inc("rate", limit_class)
+            for message in _reject(429, "Too many requests", retry_after):
+                await send(message)
+            return
+
+        if scope["path"].startswith(LONG_LIVED_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        if self._slots is None:
+            # Created here so it belongs to the worker's running loop
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        try:
+            if self._slots.locked():
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            else:
+                await self._slots.acquire()
+        except asyncio.TimeoutError:
+            self.rejected["concurrency"] += 1
+            http_requests_rejected.inc("concurrency", limit_class)
+            for message in _reject(503, "Server busy, retry shortly", 1):
+                await send(message)
+            return
+        self.in_flight += 1
+        try:
+            # Streamed bodies keep their slot until the last chunk is sent
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "limits": {name: {"rate_per_second": rate, "burst": burst} for name, (rate, burst) in self.buckets.limits.items()},
+            "tracked_clients": len(self.buckets),
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "rejected": dict(self.rejected),
+        }
+
+
+def limiter_stats() -> list:
+    return [m.stats() for m in _middlewares]
@@ -6,7 +6,10 @@ Copy and modify these examples for your specific needs.
 """
 
 from datetime import datetime
-from database import create_document, get_documents, update_document, delete_document
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from database import create_document, get_documents, update_document, update_matching, delete_document, delete_documents, increment_counters
+from batch_writer import writer_from_env
 
 # =============================================================================
 # USER MANAGEMENT SCHEMA
@@ -51,29 +54,84 @@ def create_blog_post(title: str, content: str, author_id: str, tags: list = None
         "status": "draft",
         "view_count": 0,
         "likes": 0,
-        "comments": []
+        "comment_count": 0
     }
     return create_document("posts", post_data)
 
+# Comments live outside the post, in fixed-size pages ("buckets") of the
+# post_comment_buckets collection keyed by (post_id, bucket), so posts stay
+# small and both appending and reading a page touch one or two small
+# documents however many comments a post has:
+#   {"post_id", "bucket": 0, 1, ..., "count", "comments": [{"seq", ...}]}
+# Comment number n (1-based, from the post's comment_count) goes to bucket
+# (n - 1) // COMMENTS_PER_BUCKET.
+COMMENTS_PER_BUCKET = 50
+
 def add_comment_to_post(post_id: str, author_id: str, comment_text: str):
-    """Add comment to a blog post"""
-    from bson import ObjectId
-    
+    """Add comment to a blog post; returns the comment id (None if the post does not exist)"""
+    counters = increment_counters("posts", post_id, {"comment_count": 1})
+    if counters is None:
+        return None
+    seq = counters["comment_count"]
     comment = {
         "id": str(ObjectId()),
+        "seq": seq,
         "author_id": author_id,
         "text": comment_text,
         "created_at": datetime.utcnow(),
         "likes": 0
     }
-    
-    # Add comment to post's comments array
-    from database import db
-    result = db.posts.update_one(
-        {"_id": ObjectId(post_id)},
-        {"$push": {"comments": comment}}
-    )
-    return result.modified_count > 0
+
+    bucket_key = {"post_id": post_id, "bucket": (seq - 1) // COMMENTS_PER_BUCKET}
+    append = {"push": {"comments": comment}, "inc": {"count": 1}}
+    try:
+        update_matching("post_comment_buckets", bucket_key, upsert=True, **append)
+    except DuplicateKeyError:
+        # Another comment created the same bucket concurrently; it exists now
+        update_matching("post_comment_buckets", bucket_key, **append)
+    return comment["id"]
+
+def get_post_comments(post_id: str, limit: int = 20, before: int = None):
+    """Newest-first page of a post's comments.
+
+    Returns {"comments": [...], "next": seq or None}; pass `next` back as
+    `before` for the following (older) page.
+    """
+    bucket_filter = {"post_id": post_id}
+    if before is not None:
+        if before <= 1:
+            return {"comments": [], "next": None}
+        bucket_filter["bucket"] = {"$lte": (before - 2) // COMMENTS_PER_BUCKET}
+    # A page spans at most this many buckets
+    bucket_count = limit // COMMENTS_PER_BUCKET + 2
+    buckets = get_documents("post_comment_buckets", bucket_filter, bucket_count, {"comments": 1}, sort=[("bucket", -1)])
+
+    comments = [c for b in buckets for c in b["comments"] if before is None or c["seq"] < before]
+    comments.sort(key=lambda c: c["seq"], reverse=True)
+    page = comments[:limit]
+    more = len(comments) > limit or (page and page[-1]["seq"] > 1)
+    return {"comments": page, "next": page[-1]["seq"] if more else None}
+
+def record_post_view(post_id: str):
+    """Count a view server-side; returns the new view_count (None if the post is gone)"""
+    counters = increment_counters("posts", post_id, {"view_count": 1})
+    return counters["view_count"] if counters else None
+
+def like_post(post_id: str):
+    """Add a like server-side; returns the new like count (None if the post is gone)"""
+    counters = increment_counters("posts", post_id, {"likes": 1})
+    return counters["likes"] if counters else None
+
+def publish_post(post_id: str):
+    """Publish a draft"""
+    return update_document("posts", post_id, set_fields={"status": "published"})
+
+def delete_post(post_id: str):
+    """Delete a blog post and its comment buckets"""
+    deleted = delete_document("posts", post_id)
+    if deleted:
+        delete_documents("post_comment_buckets", {"post_id": post_id})
+    return deleted
 
 # =============================================================================
 # E-COMMERCE SCHEMA
@@ -251,8 +309,12 @@ def create_booking(event_id: str, user_id: str, ticket_quantity: int = 1):
 # ANALYTICS/TRACKING SCHEMA
 # =============================================================================
 
+# Tracking events are written behind the request in batches (see batch_writer.py)
+activity_writer = writer_from_env("user_activities")
+page_view_writer = writer_from_env("page_views")
+
 def track_user_activity(user_id: str, action: str, resource_type: str, resource_id: str, metadata: dict = None):
-    """Track user activity for analytics"""
+    """Track user activity for analytics; returns the event id, or None if the event was dropped"""
     activity_data = {
         "user_id": user_id,
         "action": action,  # view, create, update, delete, login, etc.
@@ -264,10 +326,15 @@ def track_user_activity(user_id: str, action: str, resource_type: str, resource_
         "session_id": None,
         "timestamp": datetime.utcnow()
     }
-    return create_document("user_activities", activity_data)
+    # The _id is assigned up front so callers get it without waiting for the write
+    activity_data["_id"] = ObjectId()
+    if not activity_writer.enqueue(activity_data):
+        # Queue full or writer closed
+        return None
+    return str(activity_data["_id"])
 
 def track_page_view(page_path: str, user_id: str = None, session_id: str = None):
-    """Track page views for analytics"""
+    """Track page views for analytics; returns the event id, or None if the event was dropped"""
     pageview_data = {
         "page_path": page_path,
         "user_id": user_id,
@@ -284,7 +351,10 @@ def track_page_view(page_path: str, user_id: str = None, session_id: str = None)
         },
         "timestamp": datetime.utcnow()
     }
-    return create_document("page_views", pageview_data)
+    pageview_data["_id"] = ObjectId()
+    if not page_view_writer.enqueue(pageview_data):
+        return None
+    return str(pageview_data["_id"])
 
 # =============================================================================
 # NOTIFICATION SCHEMA
@@ -315,6 +385,11 @@ if __name__ == "__main__":
     
     # Create a blog post
     # post_id = create_blog_post("My First Post", "This is the content", user_id, ["tech", "python"])
+
+    # Comment on it and read the newest comments, then the page before them
+    # add_comment_to_post(post_id, user_id, "First!")
+    # page = get_post_comments(post_id, limit=20)
+    # older = get_post_comments(post_id, limit=20, before=page["next"])
     
     # Create a product
     # product_id = create_product("iPhone 15", 999.99, "Latest iPhone", "Electronics")
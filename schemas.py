@@ -66,3 +66,84 @@ class Gadget(BaseModel):
     description: str = Field(..., description="What it does")
     first_appearance: Optional[str] = Field(None, description="First notable appearance")
     image_url: Optional[HttpUrl] = Field(None, description="Preview image URL")
+
+# Partial updates (PATCH): only the fields sent are changed
+class BatmobileUpdate(BaseModel):
+    name: Optional[str] = None
+    year: Optional[int] = None
+    media: Optional[str] = None
+    title: Optional[str] = None
+    driver: Optional[str] = None
+    era: Optional[str] = None
+    universe: Optional[str] = None
+    description: Optional[str] = None
+    specs: Optional[List[str]] = None
+    designer: Optional[str] = None
+    image_url: Optional[HttpUrl] = None
+    source: Optional[str] = None
+
+class GadgetUpdate(BaseModel):
+    name: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    first_appearance: Optional[str] = None
+    image_url: Optional[HttpUrl] = None
+
+# Rows of the list endpoints: the stored fields plus the document id that the
+# PATCH/DELETE routes take. With fields= only the id and the listed fields are sent.
+class BatmobileRow(Batmobile):
+    id: str = Field(..., description="Document id")
+
+class GadgetRow(Gadget):
+    id: str = Field(..., description="Document id")
+
+# Natural keys identifying a catalog entry; seeding upserts on these and
+# each one is backed by a unique index (see INDEXES below)
+NATURAL_KEYS = {
+    "batmobile": ["name", "year"],
+    "gadget": ["name"],
+}
+
+# Fields searched by GET /api/search and their relative weights
+SEARCH_WEIGHTS = {
+    "batmobile": {"name": 10, "title": 5, "specs": 3, "description": 1},
+    "gadget": {"name": 10, "category": 5, "description": 1},
+}
+
+# Index registry, applied idempotently at startup.
+# Each entry is ([(field, direction), ...], {index options}); direction is
+# 1 or -1, or "text" for the full-text search index.
+# Listings sorted on a field are ordered by (field, _id) (database.paged_query),
+# so each sortable field has a (field, _id) index and main.sortable_fields()
+# only accepts fields that do. Equality filters combined with a sort use the
+# (filter, sort field, _id) shapes; a filter alone uses (filter, _id), which
+# also keeps the default _id order index-backed.
+INDEXES = {
+    "batmobile": [
+        ([(f, 1) for f in NATURAL_KEYS["batmobile"]], {"unique": True, "name": "natural_key"}),
+        ([("name", 1), ("_id", 1)], {}),
+        ([("year", 1), ("_id", 1)], {}),
+        ([("era", 1), ("_id", 1)], {}),
+        ([("universe", 1), ("_id", 1)], {}),
+        ([("media", 1), ("_id", 1)], {}),
+        ([("era", 1), ("year", 1), ("_id", 1)], {}),
+        ([("universe", 1), ("year", 1), ("_id", 1)], {}),
+        ([("media", 1), ("year", 1), ("_id", 1)], {}),
+        ([(f, "text") for f in SEARCH_WEIGHTS["batmobile"]], {"weights": SEARCH_WEIGHTS["batmobile"], "name": "search_text"}),
+    ],
+    "gadget": [
+        ([(f, 1) for f in NATURAL_KEYS["gadget"]], {"unique": True, "name": "natural_key"}),
+        ([("name", 1), ("_id", 1)], {}),
+        ([("category", 1), ("_id", 1)], {}),
+        ([("category", 1), ("name", 1), ("_id", 1)], {}),
+        ([(f, "text") for f in SEARCH_WEIGHTS["gadget"]], {"weights": SEARCH_WEIGHTS["gadget"], "name": "search_text"}),
+    ],
+    # Looked up by get_user_by_email in schema_examples.py
+    "users": [
+        ([("email", 1)], {}),
+    ],
+    # Comment pages of schema_examples.add_comment_to_post, read newest first
+    "post_comment_buckets": [
+        ([("post_id", 1), ("bucket", -1)], {"unique": True}),
+    ],
+}
@@ -0,0 +1,105 @@
+"""
+Catalog Search
+
+Ranked full-text search across the Batmobile and Gadget collections.
+Uses the weighted Mongo text indexes declared in schemas.INDEXES. On the
+mongomock stand-in, which cannot run $text, an in-memory inverted index is
+built per collection and rebuilt whenever the collection's revision changes.
+A real server that rejects the $text query (e.g. the text index failed to
+build) is logged and reported as an error: scanning whole collections into
+every worker is not a production fallback.
+"""
+
+import logging
+import re
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from pymongo.errors import OperationFailure
+
+from database import (
+    build_projection,
+    get_documents_async,
+    get_revision_async,
+    is_mock_database,
+    text_search_async,
+)
+from schemas import SEARCH_WEIGHTS
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text) -> List[str]:
+    if text is None:
+        return []
+    if isinstance(text, (list, tuple)):
+        return [token for item in text for token in tokenize(item)]
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class InvertedIndex:
+    """Token -> {document position: weighted term frequency} for one collection"""
+
+    def __init__(self, documents: List[dict], weights: Dict[str, int]):
+        self.documents = documents
+        self.postings = defaultdict(dict)
+        for position, doc in enumerate(documents):
+            for field, weight in weights.items():
+                for token in tokenize(doc.get(field)):
+                    self.postings[token][position] = self.postings[token].get(position, 0) + weight
+
+    def search(self, query: str, limit: int) -> List[dict]:
+        """Documents matching any query term, scored by summed term weights"""
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            for position, weight in self.postings.get(token, {}).items():
+                scores[position] += weight
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [dict(self.documents[position], score=score) for position, score in best]
+
+
+# collection name -> (revision the index was built at, index)
+_fallback_indexes: Dict[str, Tuple[int, InvertedIndex]] = {}
+
+
+async def _fallback_search(collection_name: str, query: str, limit: int, projection: dict) -> List[dict]:
+    revision, _ = await get_revision_async(collection_name)
+    built = _fallback_indexes.get(collection_name)
+    if built is None or built[0] != revision:
+        documents = await get_documents_async(collection_name, {}, None, projection)
+        built = (revision, InvertedIndex(documents, SEARCH_WEIGHTS[collection_name]))
+        _fallback_indexes[collection_name] = built
+    return built[1].search(query, limit)
+
+
+async def search_collection(collection_name: str, query: str, limit: int, fields: List[str]) -> List[dict]:
+    """Best `limit` hits in one collection, each with a `score` and its `_id`"""
+    projection = build_projection(fields)
+    projection["_id"] = 1
+    if is_mock_database():
+        return await _fallback_search(collection_name, query, limit, projection)
+    try:
+        return await text_search_async(collection_name, query, limit, projection)
+    except OperationFailure as e:
+        # Usually the text index is missing (e.g. it failed to build at startup)
+        logger.error("Text search on %s failed: %s", collection_name, e)
+        raise
+
+
+async def search_catalog(query: str, limit: int, offset: int, models: Dict[str, type]) -> List[dict]:
+    """Ranked hits across collections for one page (offset, limit).
+
+    Each collection contributes at most offset + limit hits, which are then
+    merged by score, so a page never reads more than that many documents
+    per collection.
+    """
+    window = offset + limit
+    hits = []
+    for collection_name, model in models.items():
+        for doc in await search_collection(collection_name, query, window, list(model.model_fields)):
+            score = doc.pop("score")
+            hits.append({"collection": collection_name, "id": str(doc.pop("_id")), "score": score, "document": doc})
+    hits.sort(key=lambda hit: -hit["score"])
+    return hits[offset:window]
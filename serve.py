@@ -0,0 +1,69 @@
+"""
+Server Launcher
+
+Production entry point: `python serve.py` (used by start_server.sh).
+Runs uvicorn with several worker processes, each importing the app on its
+own, so every worker creates its own Mongo clients on first use.
+
+Settings come from environment variables:
+- HOST / PORT: bind address (0.0.0.0:8000)
+- WEB_CONCURRENCY: worker processes (default: one per CPU)
+- SERVER_LOOP / SERVER_HTTP: "auto" picks uvloop / httptools when installed
+- SERVER_KEEPALIVE_SECONDS: idle keep-alive timeout (default 5)
+- SERVER_BACKLOG: pending connection queue size (default 2048)
+- SERVER_GRACEFUL_TIMEOUT_SECONDS: on SIGTERM/SIGINT, time given to in-flight
+  requests to finish before connections are closed (default 30)
+- SERVER_LIMIT_MAX_REQUESTS: restart a worker after this many requests
+  (default 0 = never)
+- SERVER_RELOAD=1: development mode, a single auto-reloading process
+"""
+
+import os
+
+import uvicorn
+
+APP = "main:app"
+
+
+def _flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = int(os.getenv(name, str(default)))
+    if value < 0:
+        raise ValueError(f"{name} must not be negative")
+    return value
+
+
+def server_options() -> dict:
+    """Keyword arguments for uvicorn.run() built from the environment"""
+    options = {
+        "host": os.getenv("HOST", "0.0.0.0"),
+        "port": int(os.getenv("PORT", "8000")),
+        "loop": os.getenv("SERVER_LOOP", "auto"),
+        "http": os.getenv("SERVER_HTTP", "auto"),
+        "timeout_keep_alive": _env_int("SERVER_KEEPALIVE_SECONDS", 5),
+        "backlog": _env_int("SERVER_BACKLOG", 2048),
+        "timeout_graceful_shutdown": _env_int("SERVER_GRACEFUL_TIMEOUT_SECONDS", 30),
+        "proxy_headers": True,
+        "forwarded_allow_ips": os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+    }
+    max_requests = _env_int("SERVER_LIMIT_MAX_REQUESTS", 0)
+    if max_requests:
+        options["limit_max_requests"] = max_requests
+
+    if _flag("SERVER_RELOAD"):
+        # Polls the source tree; development only
+        options["reload"] = True
+    else:
+        options["workers"] = _env_int("WEB_CONCURRENCY", os.cpu_count() or 1) or 1
+    return options
+
+
+def main():
+    uvicorn.run(APP, **server_options())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Slow Query Log
+
+The database.py helpers time every call, including waiting for a pooled
+connection. Calls slower than SLOW_QUERY_MS (default 100) are kept in a
+bounded ring buffer (SLOW_QUERY_LOG_SIZE, default 200) shown at
+GET /api/admin/slow-queries, and logged as one JSON line each on the
+"slow_query" logger.
+
+Entries hold the filter's shape with every value replaced by "?", never the
+values themselves. Reads are also explained ("executionStats") in the
+background, at most once per query shape every
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS, and the entry gains a summary: winning
+plan stages (COLLSCAN vs IXSCAN), indexes used, keys and documents examined.
+Set SLOW_QUERY_EXPLAIN=0 to skip the explains.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+
+import orjson
+
+from metrics import Counter
+
+logger = logging.getLogger("slow_query")
+
+mongo_slow_queries = Counter(
+    "mongo_slow_queries_total",
+    "Database helper calls slower than SLOW_QUERY_MS",
+    ("operation", "collection"),
+)
+
+
+def redact(value: Any) -> Any:
+    """Shape of a filter or sort: keys and operators kept, values replaced by "?" """
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            # $and / $or / $nor clauses
+            return [redact(item) for item in value]
+        return ["?"]
+    return "?"
+
+
+def _plan_stages(plan: dict) -> List[dict]:
+    """Stages of a winning plan, outermost first"""
+    stages = []
+    while plan:
+        stages.append(plan)
+        children = plan.get("inputStages") or ([plan["inputStage"]] if "inputStage" in plan else [])
+        for child in children[1:]:
+            stages.extend(_plan_stages(child))
+        plan = children[0] if children else None
+    return stages
+
+
+def summarize_explain(explain: dict) -> dict:
+    """Compact executionStats summary of an explain() result"""
+    if "stages" in explain and "queryPlanner" not in explain:
+        # Aggregations put the find part under the first $cursor stage
+        for stage in explain["stages"]:
+            if "$cursor" in stage:
+                explain = stage["$cursor"]
+                break
+    winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+    # Slot-based engine (MongoDB 5.0+) nests the classic plan
+    winning = winning.get("queryPlan", winning)
+    stages = _plan_stages(winning)
+    stats = explain.get("executionStats", {})
+    names = [stage.get("stage") for stage in stages]
+    return {
+        "plan": "COLLSCAN" if "COLLSCAN" in names else ("IXSCAN" if "IXSCAN" in names else (names[-1] if names else None)),
+        "stages": names,
+        "indexes": [stage["indexName"] for stage in stages if "indexName" in stage],
+        "returned": stats.get("nReturned"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "execution_ms": stats.get("executionTimeMillis"),
+    }
+
+
+def document_count(result: Any) -> Optional[int]:
+    """Documents returned or written, from a helper's return value"""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])
+    if isinstance(result, dict) and "inserted" in result:
+        return result["inserted"] + result["matched"]
+    if isinstance(result, bool):
+        return int(result)
+    if isinstance(result, int):
+        return result
+    if result is None:
+        return 0
+    return 1
+
+
+class SlowQueryLog:
+    """Ring buffer of slow helper calls"""
+
+    def __init__(self, threshold_ms: float = 100.0, size: int = 200, explain: bool = True, explain_interval: float = 60.0):
+        self.threshold_ms = threshold_ms
+        self.explain_enabled = explain
+        self.explain_interval = explain_interval
+        self._entries = deque(maxlen=size)
+        self._last_explained = {}
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.recorded = 0
+
+    def record(self, operation: str, collection_name: str, duration_ms: float, filter_dict: Optional[dict],
+               documents: Optional[int], error: Optional[str] = None, **details) -> dict:
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "operation": operation,
+            "collection": collection_name,
+            "duration_ms": round(duration_ms, 3),
+            "filter": redact(filter_dict or {}),
+            "documents": documents,
+        }
+        entry.update({k: v for k, v in details.items() if v is not None})
+        if error:
+            entry["error"] = error
+        with self._lock:
+            entry["id"] = self._next_id
+            self._next_id += 1
+            self._entries.append(entry)
+            self.recorded += 1
+        mongo_slow_queries.inc(operation, collection_name)
+        logger.warning(orjson.dumps(dict(entry, event="slow_query"), default=str).decode())
+        return entry
+
+    def should_explain(self, entry: dict) -> bool:
+        """At most one explain per query shape per interval"""
+        if not self.explain_enabled:
+            return False
+        shape = orjson.dumps([entry["operation"], entry["collection"], entry["filter"], entry.get("sort")], default=str)
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_explained.get(shape)
+            if last is not None and now - last < self.explain_interval:
+                return False
+            if len(self._last_explained) > 1000:
+                self._last_explained.clear()
+            self._last_explained[shape] = now
+        return True
+
+    def attach_explain(self, entry: dict, summary: dict):
+        with self._lock:
+            entry["explain"] = summary
+        logger.warning(orjson.dumps({"event": "slow_query_explain", "id": entry["id"], "explain": summary}, default=str).decode())
+
+    def entries(self, limit: Optional[int] = None) -> List[dict]:
+        """Newest first"""
+        with self._lock:
+            entries = [dict(entry) for entry in reversed(self._entries)]
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain": self.explain_enabled,
+            "recorded": self.recorded,
+            "buffered": len(self._entries),
+            "size": self._entries.maxlen,
+        }
+
+
+slow_queries = SlowQueryLog(
+    threshold_ms=float(os.getenv("SLOW_QUERY_MS", "100")),
+    size=int(os.getenv("SLOW_QUERY_LOG_SIZE", "200")),
+    explain=os.getenv("SLOW_QUERY_EXPLAIN", "1") != "0",
+    explain_interval=float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", "60")),
+)
@@ -1,10 +1,10 @@
 #!/bin/bash
 echo "Starting FastAPI backend server..."
 
-# Find and kill MainThread processes
-PIDS=$(ps | grep uvicorn | grep -v grep | awk '{print $1}')
+# Find and kill running server processes (SIGTERM lets in-flight requests finish)
+PIDS=$(ps | grep -E "uvicorn|serve.py" | grep -v grep | awk '{print $1}')
 if [ ! -z "$PIDS" ]; then
-  echo "Killing uvicorn processes: $PIDS"
+  echo "Killing server processes: $PIDS"
   for pid in $PIDS; do
     kill $pid 2>/dev/null || true
   done
@@ -15,5 +15,7 @@ mkdir -p logs
 echo "Installing dependencies..."
 pip install -r requirements.txt
 echo "Starting FastAPI server..."
-nohup uvicorn main:app --host 0.0.0.0 --port 8000 --reload > logs/server.log 2>&1 
+# Multi-worker by default; tune with WEB_CONCURRENCY and SERVER_* (see serve.py).
+# Set SERVER_RELOAD=1 for the single auto-reloading development process.
+nohup python serve.py > logs/server.log 2>&1 
 echo "Server started in background"
@@ -0,0 +1,135 @@
+"""Keyset pagination (database.paged_query / _keyset_filter) against mongomock
+
+Needs the development requirements: pip install -r requirements-dev.txt
+"""
+
+import asyncio
+import random
+
+import mongomock
+import mongomock_motor
+import pytest
+from bson import ObjectId
+
+import database
+from database import decode_cursor, encode_cursor, paged_query
+
+# Duplicates, explicit nulls and a missing field, which sorts like null
+YEARS = [1989, None, 1966, 1989, 2005, None, 1966, 1989, 2022, 1992, 1992]
+PAGE_SIZES = [1, 2, 3, 4, 50]
+
+
+@pytest.fixture
+def collection():
+    docs = []
+    for index, year in enumerate(YEARS + ["missing"]):
+        doc = {"_id": ObjectId(), "name": f"car-{index}", "kind": "film" if index % 2 else "comic"}
+        if year != "missing":
+            doc["year"] = year
+        docs.append(doc)
+    # Insertion order must not line up with either sort
+    random.Random(7).shuffle(docs)
+    coll = mongomock.MongoClient()["test"]["batmobile"]
+    coll.insert_many(docs)
+    return coll
+
+
+def expected_order(coll, filter_dict, sort_field, direction):
+    """(sort value, _id) order with nulls first ascending and last descending"""
+    docs = list(coll.find(filter_dict or {}))
+    if not sort_field:
+        return [d["_id"] for d in sorted(docs, key=lambda d: d["_id"])]
+    key = lambda d: (d.get(sort_field) is not None, d.get(sort_field) or 0, d["_id"])
+    return [d["_id"] for d in sorted(docs, key=key, reverse=direction == -1)]
+
+
+def page_through(coll, page_size, filter_dict=None, sort_field=None, direction=1):
+    """Every _id in the order the pages return them"""
+    seen, cursor, pages = [], None, 0
+    while True:
+        query, sort = paged_query(filter_dict, cursor, sort_field, direction)
+        docs = list(coll.find(query).sort(sort).limit(page_size + 1))
+        pages += 1
+        assert pages <= len(YEARS) + 2, "pagination does not terminate"
+        seen.extend(d["_id"] for d in docs[:page_size])
+        if len(docs) <= page_size:
+            return seen
+        cursor = encode_cursor(docs[page_size - 1], sort_field, direction)
+
+
+@pytest.mark.parametrize("page_size", PAGE_SIZES)
+@pytest.mark.parametrize("direction", [1, -1])
+def test_sorted_pages_return_every_document_once_in_order(collection, page_size, direction):
+    seen = page_through(collection, page_size, None, "year", direction)
+    assert len(seen) == len(set(seen)) == collection.count_documents({})
+    assert seen == expected_order(collection, None, "year", direction)
+
+
+@pytest.mark.parametrize("page_size", PAGE_SIZES)
+def test_unsorted_pages_follow_id_order(collection, page_size):
+    assert page_through(collection, page_size) == expected_order(collection, None, None, 1)
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_filter_is_kept_on_later_pages(collection, direction):
+    seen = page_through(collection, 2, {"kind": "film"}, "year", direction)
+    assert seen == expected_order(collection, {"kind": "film"}, "year", direction)
+
+
+def test_pages_resume_after_a_null_cursor(collection):
+    nulls = collection.count_documents({"year": None})
+    # Ascending, the first pages hold exactly the nulls
+    query, sort = paged_query(None, None, "year", 1)
+    last_null = list(collection.find(query).sort(sort).limit(nulls))[-1]
+    assert last_null.get("year") is None
+    query, sort = paged_query(None, encode_cursor(last_null, "year", 1), "year", 1)
+    rest = list(collection.find(query).sort(sort))
+    assert len(rest) == collection.count_documents({}) - nulls
+    assert all(d.get("year") is not None for d in rest)
+
+
+def test_cursor_must_match_the_sort(collection):
+    doc = collection.find_one({"year": 1989})
+    ascending = encode_cursor(doc, "year", 1)
+    assert decode_cursor(ascending, "year", 1)["k"] == 1989
+    with pytest.raises(ValueError, match="does not match"):
+        paged_query(None, ascending, "year", -1)
+    with pytest.raises(ValueError, match="does not match"):
+        paged_query(None, ascending, "name", 1)
+    with pytest.raises(ValueError, match="does not match"):
+        paged_query(None, ascending)
+    with pytest.raises(ValueError, match="does not match"):
+        paged_query(None, encode_cursor(doc), "year", 1)
+
+
+@pytest.mark.parametrize("token", ["not a cursor", "eyJpZCI6ICJ4In0"])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        paged_query(None, token, "year", 1)
+
+
+def test_get_page_async_pages_with_projection(collection, monkeypatch):
+    client = mongomock_motor.AsyncMongoMockClient(mock_mongo_client=collection.database.client)
+    monkeypatch.setattr(database, "async_db", client["test"])
+
+    async def read_all(direction):
+        ids, cursor = [], None
+        while True:
+            docs, cursor = await database.get_page_async("batmobile", None, 3, cursor, ["name"], "year", direction)
+            assert all(set(d) == {"id", "name"} for d in docs)
+            ids.extend(ObjectId(d["id"]) for d in docs)
+            if cursor is None:
+                return ids
+
+    for direction in (1, -1):
+        assert asyncio.run(read_all(direction)) == expected_order(collection, None, "year", direction)
+
+
+def test_sortable_fields_have_a_field_id_index():
+    import main
+    from schemas import INDEXES
+
+    for collection_name in ("batmobile", "gadget"):
+        shapes = [[field for field, _ in keys] for keys, _ in INDEXES[collection_name]]
+        for field in main.sortable_fields(collection_name):
+            assert [field, "_id"] in shapes